@@ -0,0 +1,158 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500  # Максимум заявок за один коммит
+BATCH_WINDOW = 0.01  # Сколько ждём, чтобы собрать одновременные нажатия в пачку
+
+JOINED = "joined"
+DUPLICATE = "duplicate"
+FULL = "full"
+INACTIVE = "inactive"
+WAITLISTED = "waitlisted"
+
+
+class JoinRequest:
+    __slots__ = ("queue_name", "user_id", "username", "order_key", "op_id", "future")
+
+    def __init__(self, queue_name, user_id, username, order_key, op_id, future):
+        self.queue_name = queue_name
+        self.user_id = str(user_id)
+        self.username = username
+        self.order_key = order_key
+        self.op_id = op_id
+        self.future = future
+
+
+class JoinAdmission:
+    """Единственная точка записи в очереди: заявки на вход упорядочиваются
+    и фиксируются пачками одним коммитом хранилища. Не поместившиеся
+    встают в лист ожидания очереди (до waitlist_size человек)."""
+
+    def __init__(self, store, max_queue_size, waitlist_size=0,
+                 batch_size=BATCH_SIZE, batch_window=BATCH_WINDOW, on_joined=None):
+        self.store = store
+        self.on_joined = on_joined  # (очередь, [(позиция, имя)]) после записи вступивших
+        self.max_queue_size = max_queue_size
+        self.waitlist_size = waitlist_size
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.stats = {"batches": 0, JOINED: 0, DUPLICATE: 0, FULL: 0, INACTIVE: 0, WAITLISTED: 0}
+        self._requests = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._sequencer())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        while not self._requests.empty():
+            request = self._requests.get_nowait()
+            if not request.future.done():
+                request.future.cancel()
+
+    async def submit(self, queue_name, user_id, username, order_key, op_id=None):
+        # order_key — update_id: Telegram нумерует обновления в порядке поступления
+        future = asyncio.get_running_loop().create_future()
+        self._requests.put_nowait(
+            JoinRequest(queue_name, user_id, username, order_key, op_id, future)
+        )
+        return await future
+
+    async def _sequencer(self):
+        while True:
+            batch = [await self._requests.get()]
+            if self.batch_window:
+                await asyncio.sleep(self.batch_window)
+            while len(batch) < self.batch_size and not self._requests.empty():
+                batch.append(self._requests.get_nowait())
+            try:
+                results = await self._commit(batch)
+            except Exception as e:
+                logger.error(f"Ошибка при записи пачки заявок: {e}")
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+            # Подтверждения отдаём только после того, как пачка записана
+            for request, result in zip(batch, results):
+                if not request.future.done():
+                    request.future.set_result(result)
+
+    async def _commit(self, batch):
+        batch.sort(key=lambda r: r.order_key)
+        results = {}
+        accepted = {}
+        sizes = {}
+        overflow = {}  # очередь -> заявки, которым не хватило места
+
+        for request in batch:
+            queue_info = self.store.get_queue(request.queue_name)
+            if not queue_info or not queue_info.get("is_active", False):
+                results[id(request)] = (INACTIVE, None)
+                continue
+            pending = accepted.setdefault(request.queue_name, {})
+            if request.user_id in pending or self.store.is_member(request.queue_name, request.user_id):
+                results[id(request)] = (DUPLICATE, None)
+                continue
+            if request.queue_name not in sizes:
+                sizes[request.queue_name] = self.store.member_count(request.queue_name)
+            if sizes[request.queue_name] >= self.max_queue_size:
+                overflow.setdefault(request.queue_name, []).append(request)
+                continue
+            sizes[request.queue_name] += 1
+            pending[request.user_id] = request
+
+        for queue_name, requests in accepted.items():
+            if not requests:
+                continue
+            # Проверки выше — по локальному снимку; окончательно вместимость и активность
+            # проверяет хранилище в той же транзакции, где пишет (его делят несколько процессов)
+            positions = self.store.add_members(
+                queue_name, [(r.user_id, r.username) for r in requests.values()],
+                max_size=self.max_queue_size,
+                op_ids=[r.op_id for r in requests.values()]
+            )
+            for request, position in zip(requests.values(), positions):
+                if position is None:
+                    results[id(request)] = (DUPLICATE, None)
+                elif position is False:
+                    queue_info = self.store.get_queue(queue_name)
+                    if queue_info is not None and queue_info.get("is_active", False):
+                        overflow.setdefault(queue_name, []).append(request)
+                    else:
+                        results[id(request)] = (INACTIVE, None)
+                else:
+                    results[id(request)] = (JOINED, position)
+            joined = [
+                (position, request.username) for request, position in zip(requests.values(), positions)
+                if position is not None and position is not False
+            ]
+            if joined and self.on_joined is not None:
+                self.on_joined(queue_name, joined)
+
+        for queue_name, requests in overflow.items():
+            requests.sort(key=lambda r: r.order_key)
+            if self.waitlist_size:
+                positions = self.store.add_waitlisted(
+                    queue_name, [(r.user_id, r.username) for r in requests],
+                    max_size=self.waitlist_size
+                )
+            else:
+                positions = [False] * len(requests)
+            for request, position in zip(requests, positions):
+                if position is None:
+                    results[id(request)] = (DUPLICATE, None)
+                elif position is False:
+                    results[id(request)] = (FULL, None)
+                else:
+                    results[id(request)] = (WAITLISTED, position)
+        await self.store.flush()
+
+        self.stats["batches"] += 1
+        for status, _ in results.values():
+            self.stats[status] += 1
+        return [results[id(request)] for request in batch]
@@ -0,0 +1,103 @@
+import gzip
+import json
+import logging
+import os
+import re
+import zlib
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+_FILE_RE = re.compile(r"^queues-(\d{4})-(\d{2})\.jsonl\.gz$")
+
+
+class QueueArchive:
+    """Закрытые очереди в сжатых JSONL-файлах по месяцам.
+
+    Каждая запись дописывается отдельным gzip-членом в конец файла месяца,
+    так что запись не переписывает уже сохранённое, а файл остаётся
+    обычным .gz (zcat читает его целиком). Файлы старше срока хранения удаляются.
+    """
+
+    def __init__(self, directory, retention_months):
+        self.directory = directory
+        self.retention_months = retention_months  # 0 — хранить без ограничения
+
+    def _path(self, moment):
+        return os.path.join(self.directory, f"queues-{moment.year:04d}-{moment.month:02d}.jsonl.gz")
+
+    def _files(self):
+        # (год, месяц, путь), новые первыми
+        if not os.path.isdir(self.directory):
+            return []
+        files = []
+        for name in os.listdir(self.directory):
+            match = _FILE_RE.match(name)
+            if match:
+                files.append((int(match[1]), int(match[2]), os.path.join(self.directory, name)))
+        return sorted(files, reverse=True)
+
+    def append(self, record, now=None):
+        now = now or datetime.now()
+        record = dict(record, archived_at=now.isoformat())
+        os.makedirs(self.directory, exist_ok=True)
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n"
+        with open(self._path(now), 'ab') as f:
+            f.write(gzip.compress(line.encode('utf-8')))
+            f.flush()
+            os.fsync(f.fileno())
+        self.prune(now)
+
+    def prune(self, now=None):
+        if not self.retention_months:
+            return 0
+        now = now or datetime.now()
+        oldest = now.year * 12 + now.month - 1 - self.retention_months
+        removed = 0
+        for year, month, path in self._files():
+            if year * 12 + month - 1 < oldest:
+                os.remove(path)
+                removed += 1
+                logger.info(f"Архив {path} старше срока хранения, удалён")
+        return removed
+
+    def search(self, query=None, limit=10):
+        # Последние архивные очереди (новые первыми), чьё имя содержит query
+        query = query.lower() if query else None
+        found = []
+        for _, _, path in self._files():
+            for record in reversed(_read_records(path)):
+                if query is None or query in record["name"].lower():
+                    found.append(record)
+                    if len(found) >= limit:
+                        return found
+        return found
+
+
+_GZIP_MAGIC = b"\x1f\x8b\x08"  # Начало gzip-члена (deflate)
+
+
+def _read_records(path):
+    # Члены gzip читаются по одному. Оборванный член (сбой во время записи) может оказаться
+    # и в середине файла, если после сбоя архив дописывали: пропускаем его до следующего заголовка
+    records = []
+    with open(path, 'rb') as f:
+        data = f.read()
+    while data:
+        decompressor = zlib.decompressobj(wbits=31)  # 31 — заголовок gzip
+        try:
+            chunk = decompressor.decompress(data)
+            if not decompressor.eof:
+                raise zlib.error("неполная запись")
+            lines = [json.loads(line) for line in chunk.decode('utf-8').splitlines() if line.strip()]
+        except (zlib.error, ValueError) as e:
+            following = data.find(_GZIP_MAGIC, 1)
+            skipped = len(data) if following == -1 else following
+            logger.warning(f"Архив {path}: пропущено {skipped} байт повреждённой записи ({e})")
+            if following == -1:
+                break
+            data = data[following:]
+            continue
+        records.extend(lines)
+        data = decompressor.unused_data
+    return records
@@ -0,0 +1,82 @@
+import asyncio
+import itertools
+import json
+import math
+import random
+import time
+from collections import Counter
+
+from telegram.request import BaseRequest, RequestData
+
+from ratelimit import TokenBucket
+
+
+class FakeBotAPI(BaseRequest):
+    """Заглушка Bot API для нагрузочных прогонов: задержки, 429 и заблокированные чаты.
+
+    Задержка каждого запроса — логнормальная с медианой latency. 429 приходит
+    случайно с вероятностью rate_limit_ratio и всегда, когда исчерпан общий
+    лимит global_rate сообщений в секунду (если он задан). Чаты из blocked
+    отвечают 403, как после блокировки бота пользователем.
+    """
+
+    MESSAGE_METHODS = ("sendMessage", "editMessageText")
+
+    def __init__(self, latency=0.05, latency_sigma=0.5, rate_limit_ratio=0.0,
+                 global_rate=None, retry_after=1, blocked=(), seed=0):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.rate_limit_ratio = rate_limit_ratio
+        self.global_bucket = TokenBucket(global_rate) if global_rate else None
+        self.retry_after = retry_after
+        self.blocked = {int(chat_id) for chat_id in blocked}
+        self.rng = random.Random(seed)
+        self.calls = Counter()  # метод -> число запросов
+        self.responses = Counter()  # HTTP-код -> число ответов
+        self.sent = Counter()  # chat_id -> доставленных сообщений
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data: RequestData = None,
+                         read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls[api_method] += 1
+        if self.latency:
+            await asyncio.sleep(self.rng.lognormvariate(math.log(self.latency), self.latency_sigma))
+        code, payload = self._respond(api_method, params)
+        self.responses[code] += 1
+        return code, json.dumps(payload).encode()
+
+    def _respond(self, api_method, params):
+        if api_method in self.MESSAGE_METHODS:
+            chat_id = int(params.get("chat_id", 0))
+            if chat_id in self.blocked:
+                return 403, {"ok": False, "error_code": 403,
+                             "description": "Forbidden: bot was blocked by the user"}
+            limited = self.global_bucket is not None and not self.global_bucket.try_acquire()
+            if limited or self.rng.random() < self.rate_limit_ratio:
+                return 429, {"ok": False, "error_code": 429,
+                             "description": f"Too Many Requests: retry after {self.retry_after}",
+                             "parameters": {"retry_after": self.retry_after}}
+            self.sent[chat_id] += 1
+            return 200, {"ok": True, "result": {
+                "message_id": next(self._message_ids), "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+                "text": params.get("text", "")
+            }}
+        if api_method == "getMe":
+            return 200, {"ok": True, "result": {
+                "id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"
+            }}
+        return 200, {"ok": True, "result": True}
@@ -0,0 +1,176 @@
+"""Гонка за места при открытии очереди: QueueBot против фейкового Bot API.
+
+    python -m bench.join_race --users 2000 --capacity 30 --latency 0.05
+
+N пользователей подписаны на уведомления; очередь открывается, рассылка
+уходит всем, и каждый пользователь в случайный момент из окна --spread
+нажимает «присоединиться» (часть — дважды). Отчёт: пропускная способность
+вступлений, задержки обработчика, время рассылки и нарушения порядка и
+вместимости. При нарушениях код выхода 1.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from telegram import Update
+
+import bot as queuebot
+import tracing
+from bench.fake_api import FakeBotAPI
+from callbacks import Op, encode
+from storage import open_storage
+
+QUEUE_NAME = "bench"
+ADMIN_ID = 1
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def join_update(bot, update_id, user_id, data):
+    return Update.de_json({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": f"u{user_id}",
+                     "username": f"user{user_id}"},
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {"message_id": 1, "date": 0,
+                        "chat": {"id": user_id, "type": "private"}, "text": "menu"}
+        }
+    }, bot)
+
+
+def make_taps(args, rng):
+    # (момент нажатия, user_id); update_id раздаются в порядке нажатий, как это делает Telegram
+    taps = []
+    for user_id in range(1000, 1000 + args.users):
+        at = rng.uniform(0, args.spread)
+        taps.append((at, user_id))
+        if rng.random() < args.double_tap:
+            taps.append((at + rng.uniform(0.01, 0.3), user_id))
+    taps.sort()
+    return taps
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    user_ids = list(range(1000, 1000 + args.users))
+    blocked = rng.sample(user_ids, int(len(user_ids) * args.blocked))
+    api = FakeBotAPI(
+        latency=args.latency, rate_limit_ratio=args.rate_limit_ratio,
+        global_rate=args.global_rate, blocked=blocked, seed=args.seed
+    )
+
+    workdir = tempfile.mkdtemp(prefix="queuebot-bench-")
+    path = os.path.join(workdir, "bench.db" if args.backend == "sqlite" else "bench.json")
+    store = open_storage(args.backend, path, ADMIN_ID)
+    queuebot.MAX_QUEUE_SIZE = args.capacity
+    queuebot.DEDUP_FILE = os.path.join(workdir, "processed_updates.json")  # update_id повторяются между прогонами
+    queuebot.TENANTS_DIR = os.path.join(workdir, "tenants")
+    bot = queuebot.QueueBot(request=api, store=store)
+    app = bot.app
+    errors = []
+
+    async def count_error(update, context):
+        errors.append(context.error)
+    app.error_handlers.clear()
+    app.add_error_handler(count_error)
+
+    await app.initialize()
+    await bot._post_init(app)
+    if args.trace:
+        tracing.enable(args.trace)  # Разбор: python -m bench.trace_report <файл>
+    try:
+        for user_id in user_ids:
+            store.register_user(user_id)
+        store.create_queue(QUEUE_NAME, {"admin_id": ADMIN_ID, "is_active": False})
+        queue_id = store.get_queue(QUEUE_NAME)["id"]
+        data = encode(Op.JOIN, queue_id)
+
+        taps = make_taps(args, rng)
+        first_tap = {}
+        updates = []
+        for update_id, (at, user_id) in enumerate(taps, 1):
+            first_tap.setdefault(str(user_id), update_id)
+            updates.append((at, join_update(app.bot, update_id, user_id, data)))
+
+        latencies = []
+
+        async def deliver(at, update):
+            await asyncio.sleep(at)
+            started = time.perf_counter()
+            await app.update_processor.process_update(update, app.process_update(update))
+            latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        job = await bot._open_queue(QUEUE_NAME)
+        await asyncio.gather(*(deliver(at, update) for at, update in updates))
+        race_time = time.perf_counter() - started
+        await job.done.wait()
+
+        members = store.members(QUEUE_NAME)
+        admitted = [first_tap[m["user_id"]] for m in members]
+        inversions = sum(1 for a, b in zip(admitted, admitted[1:]) if a > b)
+        # Нажал раньше кого-то из принятых, но сам в очередь не попал
+        last_admitted = max(admitted, default=0)
+        member_ids = {m["user_id"] for m in members}
+        overtaken = sum(
+            1 for user_id, update_id in first_tap.items()
+            if update_id < last_admitted and user_id not in member_ids
+        )
+        over_capacity = max(0, len(members) - args.capacity)
+        duplicates = len(members) - len(member_ids)
+
+        print(f"backend={args.backend} users={args.users} capacity={args.capacity} "
+              f"taps={len(taps)} latency={args.latency * 1000:.0f}ms")
+        print(f"joins:      {len(members)} admitted, {len(taps) / race_time:.0f} taps/s, "
+              f"{len(members) / race_time:.0f} joins/s over {race_time:.2f} s")
+        print(f"handler:    p50 {percentile(latencies, 0.5) * 1000:.1f} ms, "
+              f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms, "
+              f"errors {dict(Counter(type(e).__name__ for e in errors))}")
+        print(f"broadcast:  {job.summary()}")
+        print(f"api:        {dict(api.calls)} responses {dict(api.responses)}")
+        print(f"admission:  {bot.admission.stats}")
+        print(f"violations: over_capacity={over_capacity} duplicates={duplicates} "
+              f"order_inversions={inversions} overtaken={overtaken}")
+        return over_capacity + duplicates + inversions + overtaken
+    finally:
+        await bot._post_stop(app)
+        await bot._post_shutdown(app)
+        await app.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон вступления в очередь")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--capacity", type=int, default=queuebot.MAX_QUEUE_SIZE)
+    parser.add_argument("--spread", type=float, default=1.0, help="окно нажатий после открытия, с")
+    parser.add_argument("--double-tap", type=float, default=0.1, help="доля пользователей, нажавших дважды")
+    parser.add_argument("--latency", type=float, default=0.05, help="медианная задержка Bot API, с")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="доля случайных 429")
+    parser.add_argument("--global-rate", type=float, default=30, help="лимит сообщений в секунду (0 — без лимита)")
+    parser.add_argument("--blocked", type=float, default=0.05, help="доля пользователей, заблокировавших бота")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--trace", help="записать трассы обновлений в этот файл")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    violations = asyncio.run(run(args))
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Несколько процессов бота на одной базе sqlite: открытия, анонсы и вступления.
+
+    python -m bench.multiprocess_check --workers 4 --users 200 --capacity 30
+
+Две очереди открываются по расписанию с интервалом в несколько секунд.
+Между открытиями ведущий процесс «падает» (выходит, не отдавая роль), и
+вторую очередь должен открыть другой процесс. Пользователи нажимают
+«присоединиться» в случайных процессах, часть — сразу в двух. Проверяется,
+что каждая очередь открыта и анонсирована ровно один раз, вместимость не
+превышена, подтверждённые вступления есть в базе, а отказ «мест нет» не
+выдан при свободных местах. --stall растягивает окно между проверкой
+вместимости и записью, чтобы гонка между процессами проявлялась наверняка.
+При нарушениях код выхода 1.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import bot as queuebot
+from admission import FULL, JOINED
+from bench.fake_api import FakeBotAPI
+from bench.join_race import join_update
+from callbacks import Op, encode
+from storage.sqlite_backend import SqliteStorage
+
+ADMIN_ID = 1
+SUBSCRIBERS = range(500, 520)
+# Моменты от старта прогона, секунды
+OPENINGS = {"alpha": 1.5, "beta": 4.0}
+CRASH_AT = 2.8
+TAP_DELAY = (0.3, 1.8)  # Окно нажатий после открытия
+FINISH_AT = 7.5
+LEASE_TTL = 1.5
+LEASE_RENEW = 0.3
+
+
+def prepare(path, start):
+    store = SqliteStorage(path, ADMIN_ID)
+    for user_id in SUBSCRIBERS:
+        store.register_user(user_id)
+    for name, offset in OPENINGS.items():
+        store.create_queue(name, {
+            "admin_id": ADMIN_ID,
+            "is_active": False,
+            "scheduled_open_time": datetime.fromtimestamp(start + offset).isoformat(),
+            "announce_pending": True
+        })
+    queue_ids = {name: store.get_queue(name)["id"] for name in OPENINGS}
+    store.conn.close()
+    return queue_ids
+
+
+def plan_taps(args):
+    # Для каждого процесса: [(момент, user_id, очередь)]
+    rng = random.Random(args.seed)
+    taps = defaultdict(list)
+    for name, offset in OPENINGS.items():
+        for user_id in range(1000, 1000 + args.users):
+            at = offset + rng.uniform(*TAP_DELAY)
+            workers = rng.sample(range(args.workers), 2 if rng.random() < args.double_tap else 1)
+            for worker in workers:
+                taps[worker].append((at + rng.uniform(0, 0.05), user_id, name))
+    return {worker: sorted(items) for worker, items in taps.items()}
+
+
+async def run_worker(index, path, start, taps, queue_ids, capacity, stall, results):
+    queuebot.MAX_QUEUE_SIZE = capacity
+    queuebot.DEDUP_FILE = os.path.join(os.path.dirname(path), f"processed_updates.{index}.json")
+    queuebot.TENANTS_DIR = os.path.join(os.path.dirname(path), "tenants")
+    store = SqliteStorage(path, ADMIN_ID)
+    bot = queuebot.QueueBot(request=FakeBotAPI(latency=0.005, seed=index), store=store)
+    bot.leader.holder = f"worker-{index}"
+    bot.leader.ttl = LEASE_TTL
+    bot.leader.renew_interval = LEASE_RENEW
+
+    # Каждое успешное открытие, снятый флаг анонса и ответ на заявку сразу уходят родителю,
+    # чтобы «упавший» процесс успел отчитаться о том, что сделал
+    open_queue, pop_flag, submit = store.open_queue, store.pop_queue_flag, bot.admission.submit
+    member_count = store.member_count
+
+    def reported_open(queue_name, opened_at):
+        opened = open_queue(queue_name, opened_at)
+        if opened:
+            results.put(("opened", index, queue_name))
+        return opened
+
+    def reported_pop(queue_name, flag):
+        popped = pop_flag(queue_name, flag)
+        if popped:
+            results.put(("announced", index, queue_name))
+        return popped
+
+    async def reported_submit(queue_name, user_id, username, order_key, op_id=None):
+        status, position = await submit(queue_name, user_id, username, order_key, op_id)
+        results.put(("join", index, queue_name, str(user_id), status, position))
+        return status, position
+
+    def stalled_count(queue_name):
+        count = member_count(queue_name)
+        time.sleep(stall)  # Другие процессы успевают записать, пока этот «думает»
+        return count
+
+    store.open_queue, store.pop_queue_flag = reported_open, reported_pop
+    store.member_count = stalled_count
+    bot.admission.submit = reported_submit
+
+    app = bot.app
+    await app.initialize()
+    await asyncio.sleep(max(0, start - time.time()))
+    await bot._post_init(app)
+
+    async def deliver(update_id, at, user_id, queue_name):
+        await asyncio.sleep(max(0, start + at - time.time()))
+        update = join_update(app.bot, update_id, user_id, encode(Op.JOIN, queue_ids[queue_name]))
+        await app.update_processor.process_update(update, app.process_update(update))
+
+    async def crash():
+        await asyncio.sleep(max(0, start + CRASH_AT - time.time()))
+        if bot.leader.is_leader:
+            results.put(("crashed", index))
+            results.close()
+            results.join_thread()  # Дописать отчёты из буфера очереди до выхода
+            os._exit(0)  # Без освобождения роли: остальные ждут истечения аренды
+
+    deliveries = [
+        asyncio.create_task(deliver(index * 100000 + n, at, user_id, queue_name))
+        for n, (at, user_id, queue_name) in enumerate(taps, 1)
+    ]
+    crash_task = asyncio.create_task(crash())
+    await asyncio.sleep(max(0, start + FINISH_AT - time.time()))
+    crash_task.cancel()
+    await asyncio.gather(*deliveries, return_exceptions=True)
+    await bot._post_stop(app)
+    await bot._post_shutdown(app)
+    await app.shutdown()
+
+
+def worker_main(index, path, start, taps, queue_ids, capacity, stall, results):
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.run(run_worker(index, path, start, taps, queue_ids, capacity, stall, results))
+
+
+def check(args, path, events):
+    violations = []
+    opened = Counter(e[2] for e in events if e[0] == "opened")
+    announced = Counter(e[2] for e in events if e[0] == "announced")
+    crashed = [e[1] for e in events if e[0] == "crashed"]
+    joins = [e for e in events if e[0] == "join"]
+
+    for name in OPENINGS:
+        if opened[name] != 1:
+            violations.append(f"{name}: открыта {opened[name]} раз")
+        if announced[name] != 1:
+            violations.append(f"{name}: анонсирована {announced[name]} раз")
+    if not crashed:
+        violations.append("ведущий не упал: смена ведущего не проверена")
+    if not joins:
+        violations.append("ни одной заявки не обработано")
+
+    store = SqliteStorage(path, ADMIN_ID)
+    try:
+        for name in OPENINGS:
+            members = {m["user_id"]: m["position"] for m in store.members(name)}
+            confirmed = {e[3]: e[5] for e in joins if e[2] == name and e[4] == JOINED}
+            statuses = Counter(e[4] for e in joins if e[2] == name)
+            if len(members) > args.capacity:
+                violations.append(f"{name}: {len(members)} участников при вместимости {args.capacity}")
+            if sorted(members.values()) != list(range(1, len(members) + 1)):
+                violations.append(f"{name}: позиции не подряд")
+            lost = [u for u, position in confirmed.items() if members.get(u) != position]
+            if lost:
+                violations.append(f"{name}: подтверждённые вступления не в базе: {len(lost)}")
+            if statuses[FULL] and len(members) < args.capacity:
+                violations.append(f"{name}: отказ «мест нет» при {len(members)} из {args.capacity}")
+            print(f"{name}: opened={opened[name]} announced={announced[name]} "
+                  f"members={len(members)}/{args.capacity} answers={dict(statuses)}")
+    finally:
+        store.conn.close()
+    print(f"crashed leader: worker-{crashed[0] if crashed else None}")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка нескольких процессов на одной базе")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--capacity", type=int, default=30)
+    parser.add_argument("--double-tap", type=float, default=0.2, help="доля нажавших сразу в двух процессах")
+    parser.add_argument("--stall", type=float, default=0.05, help="пауза после чтения числа участников, с")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="queuebot-mp-"), "queue.db")
+    start = time.time() + 3  # Запас на запуск процессов
+    queue_ids = prepare(path, start)
+    taps = plan_taps(args)
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=worker_main,
+            args=(index, path, start, taps.get(index, []), queue_ids, args.capacity, args.stall, results)
+        )
+        for index in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+
+    events = []
+    while any(p.is_alive() for p in processes) or not results.empty():
+        try:
+            events.append(results.get(timeout=0.2))
+        except queue.Empty:
+            pass
+    for process in processes:
+        process.join()
+
+    violations = check(args, path, events)
+    for violation in violations:
+        print(f"VIOLATION: {violation}")
+    print("ok" if not violations else f"{len(violations)} violations")
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Сводка по трассам обновлений и дампам профилировщика: где уходит время.
+
+    python -m bench.trace_report traces/updates.jsonl*
+    python -m bench.trace_report traces/updates.jsonl --pstats profiles/profile-20240101-120000.pstats
+
+По трассам (запись QUEUEBOT_TRACE=1 или /trace on): время обновлений по
+видам и кнопкам, горячие отрезки по собственному времени (без вложенных)
+и самые медленные обновления с их деревом отрезков. По дампу /profile —
+функции с наибольшим накопленным временем.
+"""
+import argparse
+import json
+import pstats
+import sys
+from collections import defaultdict
+
+from bench.join_race import percentile
+
+
+def read_traces(paths):
+    traces = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    traces.append(json.loads(line))
+                except ValueError:
+                    pass  # Строка, оборванная ротацией или остановкой
+    return traces
+
+
+def self_times(trace):
+    # Собственное время отрезка — его длительность минус прямые вложенные
+    spans = trace["spans"]
+    own = [span["ms"] or 0.0 for span in spans]
+    for span in spans:
+        if span["parent"] is not None and span["ms"] is not None:
+            own[span["parent"]] -= span["ms"]
+    return own
+
+
+def report_updates(traces):
+    groups = defaultdict(list)
+    for trace in traces:
+        groups[trace.get("op") or trace.get("kind", "?")].append(trace["ms"])
+    print(f"{'update':<24}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, values in sorted(groups.items(), key=lambda item: -sum(item[1])):
+        print(f"{name:<24}{len(values):>8}{percentile(values, 0.5):>10.1f}"
+              f"{percentile(values, 0.95):>10.1f}{max(values):>10.1f}")
+
+
+def report_spans(traces, top):
+    durations = defaultdict(list)
+    own_total = defaultdict(float)
+    for trace in traces:
+        own = self_times(trace)
+        for span, own_ms in zip(trace["spans"], own):
+            if span["ms"] is None:
+                continue
+            durations[span["name"]].append(span["ms"])
+            own_total[span["name"]] += own_ms
+    total = sum(own_total.values()) or 1.0
+    print(f"\n{'span':<28}{'count':>8}{'self ms':>12}{'self %':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, own_ms in sorted(own_total.items(), key=lambda item: -item[1])[:top]:
+        values = durations[name]
+        print(f"{name:<28}{len(values):>8}{own_ms:>12.1f}{own_ms / total * 100:>7.1f}%"
+              f"{percentile(values, 0.5):>10.1f}{percentile(values, 0.95):>10.1f}{max(values):>10.1f}")
+
+
+def report_slowest(traces, count):
+    print("\nСамые медленные обновления:")
+    for trace in sorted(traces, key=lambda t: -t["ms"])[:count]:
+        label = trace.get("op") or trace.get("kind", "?")
+        print(f"  update {trace['update_id']} {label}: {trace['ms']:.1f} ms")
+        depth = {}
+        for index, span in enumerate(trace["spans"]):
+            depth[index] = 0 if span["parent"] is None else depth[span["parent"]] + 1
+            duration = f"{span['ms']:.1f} ms" if span["ms"] is not None else "не завершён"
+            print(f"    {'  ' * depth[index]}{span['name']} +{span['at']:.1f}: {duration}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сводка по трассам обновлений и профилю")
+    parser.add_argument("traces", nargs="*", help="файлы трасс (с ротацией: updates.jsonl*)")
+    parser.add_argument("--pstats", action="append", default=[], help="дамп /profile")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--slowest", type=int, default=5)
+    args = parser.parse_args()
+    if not args.traces and not args.pstats:
+        parser.error("нужны файлы трасс или --pstats")
+
+    if args.traces:
+        traces = read_traces(args.traces)
+        if not traces:
+            print("Трасс нет")
+        else:
+            print(f"Обновлений: {len(traces)}\n")
+            report_updates(traces)
+            report_spans(traces, args.top)
+            report_slowest(traces, args.slowest)
+
+    for path in args.pstats:
+        print(f"\nПрофиль {path}:")
+        pstats.Stats(path, stream=sys.stdout).strip_dirs().sort_stats("cumulative").print_stats(args.top)
+
+
+if __name__ == "__main__":
+    main()
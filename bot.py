@@ -1,625 +1,1148 @@
-import logging
-import json
-import os
-import random
-import asyncio
-from datetime import datetime, timedelta
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import (
-    Application, CommandHandler, CallbackQueryHandler,
-    MessageHandler, ContextTypes, filters
-)
-
-BOT_TOKEN = "123456789"
-MAIN_ADMIN_ID = 123456789
-DATA_FILE = "queue_data.json"
-MAX_QUEUE_SIZE = 30
-
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
-logger = logging.getLogger(__name__)
-
-class QueueBot:
-    def __init__(self):
-        self.app = Application.builder().token(BOT_TOKEN).build()
-        self._init_handlers()
-        self._ensure_data_file()
-        self.scheduled_tasks = {}
-        self.waiting_for_queue_name = False  # Флаг ожидания названия очереди
-
-    def _ensure_data_file(self):
-        if not os.path.exists(DATA_FILE):
-            with open(DATA_FILE, 'w') as f:
-                json.dump({
-                    "admins": [str(MAIN_ADMIN_ID)],
-                    "queues": {},
-                    "queue_users": {},
-                    "all_users": []
-                }, f, indent=2)
-
-    def _load_data(self):
-        try:
-            with open(DATA_FILE, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Ошибка загрузки данных: {e}")
-            return {"admins": [], "queues": {}, "queue_users": {}, "all_users": []}
-
-    def _save_data(self, data):
-        try:
-            with open(DATA_FILE, 'w') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            return True
-        except Exception as e:
-            logger.error(f"Ошибка сохранения данных: {e}")
-            return False
-
-    def _is_admin(self, user_id):
-        data = self._load_data()
-        return str(user_id) in data.get("admins", []) or user_id == MAIN_ADMIN_ID
-
-    async def _get_username(self, user):
-        return user.username or f"{user.first_name or ''} {user.last_name or ''}".strip()
-
-    async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        user = update.effective_user
-        self.waiting_for_queue_name = False  # Сбрасываем флаг ожидания
-        
-        data = self._load_data()
-        
-        if "all_users" not in data:
-            data["all_users"] = []
-        if str(user.id) not in data["all_users"]:
-            data["all_users"].append(str(user.id))
-            self._save_data(data)
-        
-        buttons = [
-            [InlineKeyboardButton("📋 Список очередей", callback_data="list_queues")],
-            [InlineKeyboardButton("➕ Присоединиться", callback_data="show_join_menu")],
-            [InlineKeyboardButton("➖ Покинуть очередь", callback_data="show_leave_menu")],
-        ]
-        
-        if self._is_admin(user.id):
-            buttons.append([InlineKeyboardButton("⚙️ Управление", callback_data="manage_queues")])
-        
-        reply_markup = InlineKeyboardMarkup(buttons)
-        
-        if update.message:
-            await update.message.reply_text(
-                f"👋 Привет, {user.first_name}! Я бот для управления очередями.",
-                reply_markup=reply_markup
-            )
-        else:
-            await update.callback_query.edit_message_text(
-                f"👋 Привет, {user.first_name}! Я бот для управления очередями.",
-                reply_markup=reply_markup
-            )
-
-    async def manage_queues_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        query = update.callback_query
-        await query.answer()
-        
-        buttons = [
-            [InlineKeyboardButton("📝 Создать очередь", callback_data="create_queue")],
-            [InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")],
-        ]
-        
-        await query.edit_message_text(
-            "⚙️ Меню управления очередями:",
-            reply_markup=InlineKeyboardMarkup(buttons)
-        )
-
-    async def create_queue_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        query = update.callback_query
-        await query.answer()
-        self.waiting_for_queue_name = True  # Устанавливаем флаг ожидания
-        await query.edit_message_text("📝 Введите название новой очереди:")
-
-    async def create_queue_process(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        if not self.waiting_for_queue_name:
-            await update.message.reply_text("Пожалуйста, используйте команду /start")
-            return
-            
-        self.waiting_for_queue_name = False  
-        data = self._load_data()
-        user = update.effective_user
-        queue_name = update.message.text.strip()
-        
-        if not queue_name:
-            await update.message.reply_text("⛔ Название не может быть пустым")
-            return
-        
-        if queue_name in data["queues"]:
-            await update.message.reply_text("⛔ Очередь с таким именем уже существует")
-            return
-        
-        delay_minutes = random.randint(30, 90)
-        open_time = datetime.now() + timedelta(minutes=delay_minutes)
-        
-        data["queues"][queue_name] = {
-            "admin_id": user.id,
-            "is_active": False,
-            "created_at": str(update.message.date),
-            "scheduled_open_time": open_time.isoformat()
-        }
-        
-        if not self._save_data(data):
-            await update.message.reply_text("⛔ Не удалось создать очередь")
-            return
-        
-        await update.message.reply_text(
-            f"⏳ Очередь '{queue_name}' будет открыта через {delay_minutes} минут "
-            f"(в {open_time.strftime('%H:%M:%S')})"
-        )
-        
-        for user_id in data["all_users"]:
-            try:
-                await self.app.bot.send_message(
-                    chat_id=user_id,
-                    text=f"🚀 Очередь '{queue_name}' будет скоро открыта для записи!\n"
-                         f"Вы получите уведомление когда она откроется!"
-                )
-            except Exception as e:
-                logger.error(f"Не удалось отправить уведомление пользователю {user_id}: {e}")
-        
-        self._schedule_queue_opening(queue_name, delay_minutes * 60)
-        await self.start(update, context)
-
-    def _schedule_queue_opening(self, queue_name, delay_seconds):
-        async def open_queue():
-            await asyncio.sleep(delay_seconds)
-            
-            data = self._load_data()
-            if queue_name not in data["queues"]:
-                return
-                
-            data["queues"][queue_name]["is_active"] = True
-            data["queues"][queue_name]["opened_at"] = datetime.now().isoformat()
-            self._save_data(data)
-            
-            await self._notify_queue_opened(queue_name)
-            
-            if queue_name in self.scheduled_tasks:
-                del self.scheduled_tasks[queue_name]
-        
-        task = asyncio.create_task(open_queue())
-        self.scheduled_tasks[queue_name] = task
-
-    async def _notify_queue_opened(self, queue_name):
-        data = self._load_data()
-        if "all_users" not in data:
-            return
-            
-        for user_id in data["all_users"]:
-            try:
-                await self.app.bot.send_message(
-                    chat_id=user_id,
-                    text=f"❗Очередь '{queue_name}' открыта для записи! ❗\n"
-                         f"❗Перейдите в меню чтобы присоединиться. ❗"
-                )
-            except Exception as e:
-                logger.error(f"Не удалось отправить уведомление пользователю {user_id}: {e}")
-
-    async def show_join_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        query = update.callback_query
-        await query.answer()
-        data = self._load_data()
-        
-        active_queues = {
-            name: info for name, info in data.get("queues", {}).items() 
-            if info.get("is_active", False)
-        }
-        
-        if not active_queues:
-            await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text="📭 Нет доступных активных очередей"
-            )
-            await self.start(update, context)
-            return
-        
-        buttons = [
-            [InlineKeyboardButton(name, callback_data=f"join_{name}")] 
-            for name in active_queues
-        ]
-        buttons.append([InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")])
-        
-        await query.edit_message_text(
-            "➕ Выберите очередь для присоединения:",
-            reply_markup=InlineKeyboardMarkup(buttons)
-        )
-
-    async def join_queue(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        query = update.callback_query
-        await query.answer()
-        data = self._load_data()
-        user = query.from_user
-        
-        queue_name = query.data.split('_')[1]
-        queue_info = data.get("queues", {}).get(queue_name)
-        
-        if not queue_info or not queue_info.get("is_active", False):
-            await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text="⛔ Очередь не найдена или неактивна"
-            )
-            await self.start(update, context)
-            return
-        
-        queue_users = data.get("queue_users", {}).get(queue_name, [])
-        
-        if any(str(user.id) == u.get("user_id") for u in queue_users):
-            await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text="ℹ️ Вы уже в этой очереди"
-            )
-            await self.start(update, context)
-            return
-        
-        if len(queue_users) >= MAX_QUEUE_SIZE:
-            await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text=f"⛔ Очередь заполнена (максимум {MAX_QUEUE_SIZE})"
-            )
-            await self.start(update, context)
-            return
-        
-        username = await self._get_username(user)
-        queue_users.append({
-            "user_id": str(user.id),
-            "username": username,
-            "position": len(queue_users) + 1
-        })
-        
-        data["queue_users"][queue_name] = queue_users
-        
-        if self._save_data(data):
-            await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text=f"✅ Вы добавлены в очередь '{queue_name}' на позицию {len(queue_users)}"
-            )
-        else:
-            await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text="⛔ Ошибка при присоединении к очереди"
-            )
-        await self.start(update, context)
-
-    async def show_leave_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        query = update.callback_query
-        await query.answer()
-        data = self._load_data()
-        user = query.from_user
-        
-        user_queues = []
-        for q_name, users in data.get("queue_users", {}).items():
-            if any(str(user.id) == u.get("user_id") for u in users):
-                if data.get("queues", {}).get(q_name, {}).get("is_active", False):
-                    user_queues.append(q_name)
-        
-        if not user_queues:
-            await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text="📭 Вы не состоите ни в одной очереди"
-            )
-            await self.start(update, context)
-            return
-        
-        buttons = [
-            [InlineKeyboardButton(name, callback_data=f"leave_{name}")] 
-            for name in user_queues
-        ]
-        buttons.append([InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")])
-        
-        await query.edit_message_text(
-            "➖ Выберите очередь для выхода:",
-            reply_markup=InlineKeyboardMarkup(buttons)
-        )
-
-    async def leave_queue(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        query = update.callback_query
-        await query.answer()
-        data = self._load_data()
-        user = query.from_user
-        
-        queue_name = query.data.split('_')[1]
-        queue_users = data.get("queue_users", {}).get(queue_name, [])
-        
-        user_index = next(
-            (i for i, u in enumerate(queue_users) if u.get("user_id") == str(user.id)),
-            None
-        )
-        
-        if user_index is None:
-            await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text="⛔ Вы не состоите в этой очереди"
-            )
-            await self.start(update, context)
-            return
-        
-        removed_position = queue_users[user_index]["position"]
-        del queue_users[user_index]
-        
-        for u in queue_users:
-            if u["position"] > removed_position:
-                u["position"] -= 1
-        
-        data["queue_users"][queue_name] = queue_users
-        
-        if self._save_data(data):
-            await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text=f"✅ Вы вышли из очереди '{queue_name}'"
-            )
-        else:
-            await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text="⛔ Ошибка при выходе из очереди"
-            )
-        await self.start(update, context)
-
-    async def list_queues(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        data = self._load_data()
-        query = update.callback_query if hasattr(update, 'callback_query') else None
-        
-        active_queues = {
-            name: info for name, info in data.get("queues", {}).items() 
-            if info.get("is_active", False)
-        }
-        
-        if not active_queues:
-            if query:
-                await context.bot.send_message(
-                    chat_id=query.message.chat_id,
-                    text="📭 Нет активных очередей"
-                )
-            else:
-                await update.message.reply_text("📭 Нет активных очередей")
-            await self.start(update, context)
-            return
-        
-        buttons = []
-        for name, info in active_queues.items():
-            count = len(data.get("queue_users", {}).get(name, []))
-            buttons.append([
-                InlineKeyboardButton(
-                    f"📌 {name} ({count}/{MAX_QUEUE_SIZE})", 
-                    callback_data=f"queue_{name}"
-                )
-            ])
-        
-        buttons.append([InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")])
-        
-        reply_markup = InlineKeyboardMarkup(buttons)
-        text = "📋 Список активных очередей:"
-        
-        if query:
-            await query.edit_message_text(text, reply_markup=reply_markup)
-        else:
-            await update.message.reply_text(text, reply_markup=reply_markup)
-
-    async def show_queue_details(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        query = update.callback_query
-        await query.answer()
-        data = self._load_data()
-        
-        queue_name = query.data.split('_')[1]
-        members = data.get("queue_users", {}).get(queue_name, [])
-        
-        message = f"👥 Очередь: {queue_name}\n\n" + \
-            "\n".join(f"{m['position']}. {m['username']}" for m in members) if members else "📭 Очередь пуста"
-        
-        buttons = []
-        if self._is_admin(query.from_user.id):
-            buttons.append([
-                InlineKeyboardButton("🔄 Поменять местами", callback_data=f"swap_menu_{queue_name}"),
-                InlineKeyboardButton("🗑️ Удалить участника", callback_data=f"remove_menu_{queue_name}")
-            ])
-            buttons.append([
-                InlineKeyboardButton("🔒 Закрыть очередь", callback_data=f"close_{queue_name}")
-            ])
-        buttons.append([InlineKeyboardButton("🔙 Назад", callback_data="list_queues")])
-        
-        await query.edit_message_text(
-            message,
-            reply_markup=InlineKeyboardMarkup(buttons)
-        )
-
-    async def show_swap_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        query = update.callback_query
-        await query.answer()
-        queue_name = query.data.split('_')[2]
-        
-        data = self._load_data()
-        members = data.get("queue_users", {}).get(queue_name, [])
-        
-        if len(members) < 2:
-            await query.answer("⚠️ Нужно минимум 2 участника для обмена")
-            return
-        
-        buttons = [
-            [InlineKeyboardButton(f"{m['position']}. {m['username']}", callback_data=f"swap_first_{queue_name}_{m['user_id']}")]
-            for m in members
-        ]
-        buttons.append([InlineKeyboardButton("❌ Отмена", callback_data=f"queue_{queue_name}")])
-        
-        await query.edit_message_text(
-            "Выберите первого участника для обмена:",
-            reply_markup=InlineKeyboardMarkup(buttons)
-        )
-
-    async def select_second_for_swap(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        query = update.callback_query
-        await query.answer()
-        _, _, queue_name, first_user_id = query.data.split('_', 3)
-        
-        data = self._load_data()
-        members = data.get("queue_users", {}).get(queue_name, [])
-        
-        buttons = [
-            [InlineKeyboardButton(f"{m['position']}. {m['username']}", callback_data=f"swap_second_{queue_name}_{first_user_id}_{m['user_id']}")]
-            for m in members if m['user_id'] != first_user_id
-        ]
-        buttons.append([InlineKeyboardButton("❌ Отмена", callback_data=f"queue_{queue_name}")])
-        
-        await query.edit_message_text(
-            "Выберите второго участника для обмена:",
-            reply_markup=InlineKeyboardMarkup(buttons)
-        )
-
-    async def process_swap(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        query = update.callback_query
-        await query.answer()
-        _, _, queue_name, first_user_id, second_user_id = query.data.split('_', 4)
-        
-        data = self._load_data()
-        queue_users = data.get("queue_users", {}).get(queue_name, [])
-        
-        first_pos = next(u['position'] for u in queue_users if u['user_id'] == first_user_id)
-        second_pos = next(u['position'] for u in queue_users if u['user_id'] == second_user_id)
-        
-        for user in queue_users:
-            if user['user_id'] == first_user_id:
-                user['position'] = second_pos
-            elif user['user_id'] == second_user_id:
-                user['position'] = first_pos
-        
-        data["queue_users"][queue_name] = sorted(queue_users, key=lambda x: x['position'])
-        self._save_data(data)
-        
-        await query.edit_message_text(
-            f"✅ Позиции {first_pos} и {second_pos} успешно поменяны местами"
-        )
-        await self.show_queue_details(update, context)
-
-    async def show_remove_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        query = update.callback_query
-        await query.answer()
-        queue_name = query.data.split('_')[2]
-        
-        data = self._load_data()
-        members = data.get("queue_users", {}).get(queue_name, [])
-        
-        buttons = [
-            [InlineKeyboardButton(f"{m['position']}. {m['username']}", callback_data=f"remove_user_{queue_name}_{m['user_id']}")]
-            for m in members
-        ]
-        buttons.append([InlineKeyboardButton("❌ Отмена", callback_data=f"queue_{queue_name}")])
-        
-        await query.edit_message_text(
-            "Выберите участника для удаления:",
-            reply_markup=InlineKeyboardMarkup(buttons)
-        )
-
-    async def process_remove(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        query = update.callback_query
-        await query.answer()
-        _, _, queue_name, user_id = query.data.split('_', 3)
-        
-        data = self._load_data()
-        queue_users = data.get("queue_users", {}).get(queue_name, [])
-        
-        removed_user = next((u for u in queue_users if u['user_id'] == user_id), None)
-        if not removed_user:
-            await query.answer("⛔ Участник не найден")
-            return
-        
-        removed_position = removed_user['position']
-        queue_users = [u for u in queue_users if u['user_id'] != user_id]
-        
-        for u in queue_users:
-            if u['position'] > removed_position:
-                u['position'] -= 1
-        
-        data["queue_users"][queue_name] = queue_users
-        self._save_data(data)
-        
-        await query.edit_message_text(
-            f"✅ Участник на позиции {removed_position} удален из очереди"
-        )
-        await self.show_queue_details(update, context)
-
-    async def close_queue(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        query = update.callback_query
-        await query.answer()
-        
-        queue_name = query.data.split('_')[1]
-        data = self._load_data()
-        
-        if queue_name in data["queues"]:
-            data["queues"][queue_name]["is_active"] = False
-            self._save_data(data)
-            
-            await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text=f"✅ Очередь '{queue_name}' закрыта"
-            )
-            await self.start(update, context)
-
-    async def button_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        query = update.callback_query
-        await query.answer()
-        data = query.data
-        
-        if data == "list_queues":
-            await self.list_queues(update, context)
-        elif data == "show_join_menu":
-            await self.show_join_menu(update, context)
-        elif data == "show_leave_menu":
-            await self.show_leave_menu(update, context)
-        elif data == "manage_queues":
-            await self.manage_queues_menu(update, context)
-        elif data.startswith("join_"):
-            await self.join_queue(update, context)
-        elif data.startswith("leave_"):
-            await self.leave_queue(update, context)
-        elif data.startswith("queue_"):
-            await self.show_queue_details(update, context)
-        elif data.startswith("swap_menu_"):
-            await self.show_swap_menu(update, context)
-        elif data.startswith("swap_first_"):
-            await self.select_second_for_swap(update, context)
-        elif data.startswith("swap_second_"):
-            await self.process_swap(update, context)
-        elif data.startswith("remove_menu_"):
-            await self.show_remove_menu(update, context)
-        elif data.startswith("remove_user_"):
-            await self.process_remove(update, context)
-        elif data == "create_queue":
-            await self.create_queue_input(update, context)
-        elif data == "back_to_main":
-            await self.start(update, context)
-        elif data.startswith("close_"):
-            await self.close_queue(update, context)
-
-    async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        logger.error("Ошибка:", exc_info=context.error)
-        if update.callback_query:
-            await update.callback_query.answer("⛔ Произошла ошибка")
-        await self.start(update, context)
-
-    def _init_handlers(self):
-        self.app.add_handler(CommandHandler("start", self.start))
-        self.app.add_handler(CommandHandler("list_queues", self.list_queues))
-        self.app.add_handler(CommandHandler("join_queue", self.show_join_menu))
-        self.app.add_handler(CommandHandler("leave_queue", self.show_leave_menu))
-        
-        self.app.add_handler(MessageHandler(
-            filters.TEXT & ~filters.COMMAND & filters.ChatType.PRIVATE,
-            self.create_queue_process
-        ))
-        
-        self.app.add_handler(CallbackQueryHandler(self.button_handler))
-        
-        self.app.add_error_handler(self.error_handler)
-
-    def run(self):
-        logger.info("Бот запускается...")
-        self.app.run_polling()
-
-if __name__ == '__main__':
-    bot = QueueBot()
-    bot.run()
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from telegram import Chat, Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.request import HTTPXRequest
+from telegram.ext import (
+    Application, ApplicationHandlerStop, CommandHandler, CallbackQueryHandler,
+    MessageHandler, TypeHandler, ContextTypes, filters
+)
+
+from admission import DUPLICATE, FULL, JOINED, WAITLISTED, JoinAdmission
+from archive import QueueArchive
+from broadcast import BROADCAST_CONCURRENCY, Broadcaster, Outbox
+from callbacks import ADMIN_OPS, REPEATABLE_OPS, CallbackDataError, Op, decode, encode
+from conversation import WAITING_QUEUE_NAME, ConversationStates
+from dedup import UpdateDeduplicator
+from keyboards import PAGE_SIZE, KeyboardCache, build_paged_keyboard, clamp_page
+from leader import LeaderElection
+from live_board import QueueBoards
+import metrics
+from render import QueueListings
+from scheduler import TimerScheduler
+from storage import open_storage
+from tenants import DEFAULT_TENANT, Tenant, TenantRegistry
+from throttle import REPEATED, CallbackThrottle
+import tracing
+from update_processor import PerUserUpdateProcessor
+from webhook import WebhookApp, serve
+
+BOT_TOKEN = os.environ.get("BOT_TOKEN", "123456789")
+MAIN_ADMIN_ID = 123456789
+STORAGE_BACKEND = "json"  # "json" или "sqlite"
+DATA_FILE = "queue_data.json"
+SQLITE_FILE = "queue_data.db"
+DEDUP_FILE = "processed_updates.json"  # Окно обработанных update_id, переживает перезапуск
+# Имя процесса для выбора ведущего, когда несколько процессов работают с одной базой sqlite
+INSTANCE_ID = os.environ.get("INSTANCE_ID") or f"{socket.gethostname()}:{os.getpid()}"
+ARCHIVE_DIR = "queue_archive"
+# Очереди групповых чатов: tenants/<id чата>/ со своими файлами данных и архивом.
+# Личные чаты работают с DATA_FILE / SQLITE_FILE и ARCHIVE_DIR, как раньше
+TENANTS_DIR = "tenants"
+ARCHIVE_AFTER = 3600  # Через сколько секунд после закрытия очередь уходит в архив
+ARCHIVE_RETENTION_MONTHS = 12  # 0 — хранить архив бессрочно
+HISTORY_LIMIT = 15
+MAX_QUEUE_SIZE = 30
+WAITLIST_SIZE = 100  # Лист ожидания заполненной очереди; 0 — без листа, сразу отказ
+PROMOTION_NOTIFY_DELAY = 1.0  # Переведённые из листа за это время получают одно общее уведомление
+# Позиция -> уведомление тому, кто на неё продвинулся
+TURN_NOTICES = {
+    1: "⏭ Вы следующий в очереди '{queue}'",
+    4: "⏳ В очереди '{queue}' перед вами 3 человека",
+}
+UPDATE_CONCURRENCY = 256
+RUN_MODE = "polling"  # "polling" или "webhook"
+WEBHOOK_LISTEN = "127.0.0.1"
+WEBHOOK_PORT = 8080
+WEBHOOK_PATH = "telegram"
+WEBHOOK_URL = None  # Внешний адрес, например "https://bot.example.com"; None — setWebhook не вызывается
+WEBHOOK_SECRET = None  # Сверяется с заголовком X-Telegram-Bot-Api-Secret-Token
+METRICS_ENABLED = False  # /metrics в формате Prometheus; выключенные метрики почти ничего не стоят
+METRICS_LISTEN = "127.0.0.1"
+METRICS_PORT = 9108
+# Трассы обновлений (обработчик -> хранилище -> Bot API) в JSONL; включаются и командой /trace on
+TRACE_ENABLED = os.environ.get("QUEUEBOT_TRACE") == "1"
+TRACE_FILE = "traces/updates.jsonl"
+PROFILE_DIR = "profiles"  # Дампы /profile в формате pstats
+PROFILE_SECONDS = 30
+PROFILE_MAX_SECONDS = 600
+
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+CALLBACK_SECONDS = metrics.Histogram(
+    "queuebot_callback_seconds", "Время обработки нажатия кнопки", ("action",)
+)
+CALLBACK_REJECTED = metrics.Counter(
+    "queuebot_callback_rejected_total", "Нажатия с устаревшими или испорченными callback_data"
+)
+
+class QueueBot:
+    def __init__(self, request=None, store=None):
+        # request и store подменяются в нагрузочных прогонах (bench/), в работе не передаются
+        if METRICS_ENABLED:
+            metrics.enable()  # До открытия хранилища, чтобы учесть и чтение при старте
+        self.metrics_server = None
+        self._profile_task = None
+        builder = Application.builder().token(BOT_TOKEN)
+        # Запросы бота идут через обёртку трассировки; выключенная, она только передаёт вызов
+        if request is None:
+            request = HTTPXRequest(connection_pool_size=BROADCAST_CONCURRENCY + 8)  # Рассылки не должны занимать весь пул
+            builder = builder.request(tracing.TracedRequest(request))
+        else:
+            builder = builder.request(tracing.TracedRequest(request)).get_updates_request(request)
+        self.app = (
+            builder
+            # Нажатия при открытии собираются в пачки; у одного пользователя — по порядку
+            .concurrent_updates(PerUserUpdateProcessor(UPDATE_CONCURRENCY))
+            .post_init(self._post_init)
+            .post_stop(self._post_stop)
+            .post_shutdown(self._post_shutdown)
+            .build()
+        )
+        self._init_handlers()
+        self._init_callback_routes()
+        self._default_store = store
+        # Хранилище, конвейер вступлений, таймеры и табло — у каждого тенанта свои
+        self.tenants = TenantRegistry(self._open_tenant, TENANTS_DIR)
+        # Лимиты Telegram общие на бота, поэтому рассылки и уведомления — одни на всех
+        self.broadcaster = Broadcaster(self.app.bot, self.tenants)
+        self.outbox = Outbox(self.broadcaster)  # Уведомления о продвижении очереди
+        self.conversations = ConversationStates()  # Что бот ждёт от каждого чата
+        self._main_menus = {}  # is_admin -> клавиатура главного меню
+        self.throttle = CallbackThrottle()
+        self.dedup = UpdateDeduplicator(DEDUP_FILE)
+        # Открытия, анонсы и архивацию ведёт только ведущий процесс
+        self.leader = LeaderElection(
+            self.tenants.get(DEFAULT_TENANT).store, INSTANCE_ID,
+            on_elected=self._sync_timers, on_lost=self._drop_timers, on_renewed=self._sync_timers
+        )
+
+    def _open_tenant(self, tenant_id):
+        if tenant_id == DEFAULT_TENANT:
+            store = self._default_store or open_storage(
+                STORAGE_BACKEND,
+                SQLITE_FILE if STORAGE_BACKEND == "sqlite" else DATA_FILE,
+                MAIN_ADMIN_ID
+            )
+            archive_dir = ARCHIVE_DIR
+        else:
+            os.makedirs(os.path.join(TENANTS_DIR, tenant_id), exist_ok=True)
+            data_file = SQLITE_FILE if STORAGE_BACKEND == "sqlite" else DATA_FILE
+            store = open_storage(
+                STORAGE_BACKEND, self.tenants.path(tenant_id, os.path.basename(data_file)), MAIN_ADMIN_ID
+            )
+            archive_dir = self.tenants.path(tenant_id, os.path.basename(ARCHIVE_DIR))
+        listings = QueueListings(store)  # Вступления дописываются в готовый состав прямо из конвейера
+        return Tenant(
+            tenant_id, store,
+            admission=JoinAdmission(
+                store, MAX_QUEUE_SIZE, waitlist_size=WAITLIST_SIZE, on_joined=listings.appended
+            ),
+            scheduler=TimerScheduler(),  # Один таймер на все открытия очередей тенанта
+            boards=QueueBoards(self.app.bot, store, self._render_board),
+            keyboards=KeyboardCache(),
+            listings=listings,
+            archive=QueueArchive(archive_dir, ARCHIVE_RETENTION_MONTHS)
+        )
+
+    # Состояние текущего тенанта: обработчики и таймеры не передают его явно
+
+    @property
+    def tenant(self):
+        return self.tenants.get()
+
+    @property
+    def store(self):
+        return self.tenants.get().store
+
+    @property
+    def admission(self):
+        return self.tenants.get().admission
+
+    @property
+    def scheduler(self):
+        return self.tenants.get().scheduler
+
+    @property
+    def boards(self):
+        return self.tenants.get().boards
+
+    @property
+    def keyboards(self):
+        return self.tenants.get().keyboards
+
+    @property
+    def listings(self):
+        return self.tenants.get().listings
+
+    @property
+    def archive(self):
+        return self.tenants.get().archive
+
+    async def _post_init(self, application: Application):
+        if TRACE_ENABLED:
+            tracing.enable(TRACE_FILE)
+        self.tenants.start()
+        self.dedup.start()
+        self.outbox.start()
+        await self.leader.start()
+        if metrics.enabled():
+            self._register_metrics()
+            self.metrics_server = await metrics.serve(METRICS_LISTEN, METRICS_PORT)
+
+    async def _post_stop(self, application: Application):
+        # После stop(), но до shutdown(): табло и уведомления ещё могут дойти до Bot API
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+        if self._profile_task is not None:
+            self._profile_task.cancel()
+        await self.leader.close()
+        await self.tenants.stop()
+        await self.outbox.close()
+        await self.broadcaster.close()
+
+    async def _post_shutdown(self, application: Application):
+        # Клиент Bot API уже закрыт: остаётся только сохранить данные
+        await self.dedup.close()
+        await self.tenants.close()
+        tracing.disable()
+
+    def _is_admin(self, user_id):
+        return self.store.is_admin(user_id)
+
+    async def _get_username(self, user):
+        return user.username or f"{user.first_name or ''} {user.last_name or ''}".strip()
+
+    async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await self._show_main_menu(update)
+
+    async def _show(self, update: Update, text, reply_markup=None):
+        # Экран отвечает на то, откуда пришёл: нажатие правит своё сообщение, команда получает ответ
+        if update.callback_query:
+            await update.callback_query.edit_message_text(text, reply_markup=reply_markup)
+        else:
+            await update.message.reply_text(text, reply_markup=reply_markup)
+
+    def _main_menu(self, is_admin):
+        # Меню одинаково у всех с той же ролью: собирается один раз
+        reply_markup = self._main_menus.get(is_admin)
+        if reply_markup is None:
+            buttons = [
+                [InlineKeyboardButton("📋 Список очередей", callback_data=encode(Op.LIST, 0))],
+                [InlineKeyboardButton("➕ Присоединиться", callback_data=encode(Op.JOIN_MENU, 0))],
+                [InlineKeyboardButton("➖ Покинуть очередь", callback_data=encode(Op.LEAVE_MENU, 0))],
+            ]
+            if is_admin:
+                buttons.append([InlineKeyboardButton("⚙️ Управление", callback_data=encode(Op.MANAGE))])
+            reply_markup = self._main_menus[is_admin] = InlineKeyboardMarkup(buttons)
+        return reply_markup
+
+    async def _show_main_menu(self, update: Update, notice=None):
+        # notice — итог действия: приходит в том же сообщении, что и меню, а не отдельным запросом
+        user = update.effective_user
+        self.conversations.pop(self._conversation_key(update))  # Сбрасываем ожидание только в этом чате
+        
+        self.store.register_user(user.id)
+        
+        text = f"👋 Привет, {user.first_name}! Я бот для управления очередями."
+        if notice:
+            text = f"{notice}\n\n{text}"
+        with tracing.span("render.menu"):
+            await self._show(update, text, self._main_menu(self._is_admin(user.id)))
+
+    async def manage_queues_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        
+        buttons = [
+            [InlineKeyboardButton("📝 Создать очередь", callback_data=encode(Op.CREATE))],
+            [InlineKeyboardButton("🔙 Назад", callback_data=encode(Op.MAIN))],
+        ]
+        
+        await query.edit_message_text(
+            "⚙️ Меню управления очередями:",
+            reply_markup=InlineKeyboardMarkup(buttons)
+        )
+
+    async def create_queue_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        self.conversations.set(self._conversation_key(update), WAITING_QUEUE_NAME)
+        await query.edit_message_text("📝 Введите название новой очереди:")
+
+    def _conversation_key(self, update):
+        # В группе название очереди ждём от того админа, что нажал «создать», а не от любого участника
+        chat = update.effective_chat
+        if chat.type in (Chat.GROUP, Chat.SUPERGROUP):
+            return (chat.id, update.effective_user.id)
+        return chat.id
+
+    async def create_queue_process(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # Посторонний текст молча игнорируем, без ответа и обращений к хранилищу
+        if self.conversations.pop(self._conversation_key(update)) != WAITING_QUEUE_NAME:
+            return
+            
+        user = update.effective_user
+        queue_name = update.message.text.strip()
+        
+        if not queue_name:
+            await update.message.reply_text("⛔ Название не может быть пустым")
+            return
+        
+        if self.store.get_queue(queue_name) is not None:
+            await update.message.reply_text("⛔ Очередь с таким именем уже существует")
+            return
+        
+        delay_minutes = random.randint(30, 90)
+        open_time = datetime.now() + timedelta(minutes=delay_minutes)
+        
+        self.store.create_queue(queue_name, {
+            "admin_id": user.id,
+            "is_active": False,
+            "created_at": str(update.message.date),
+            "scheduled_open_time": open_time.isoformat(),
+            "announce_pending": True
+        })
+        
+        # На ведомом процессе анонс и таймер подхватит ведущий при следующей сверке
+        if self.leader.is_leader:
+            self._announce_queue(queue_name)
+            self._schedule_queue_opening(queue_name, open_time)
+        
+        # Очередь уже создана и откроется по расписанию: без табло она работает
+        try:
+            await self.boards.post(queue_name, update.effective_chat.id)
+        except Exception as e:
+            logger.error(f"Не удалось опубликовать табло очереди '{queue_name}': {e}")
+        await self._show_main_menu(
+            update,
+            f"⏳ Очередь '{queue_name}' будет открыта через {delay_minutes} минут "
+            f"(в {open_time.strftime('%H:%M:%S')})"
+        )
+
+    def _announce_queue(self, queue_name):
+        # Флаг снимает ровно один процесс, поэтому анонс не уйдёт дважды
+        if not self.store.pop_queue_flag(queue_name, "announce_pending"):
+            return None
+        queue_info = self.store.get_queue(queue_name) or {}
+        return self.broadcaster.broadcast(
+            self.store.subscribers(),
+            f"🚀 Очередь '{queue_name}' будет скоро открыта для записи!\n"
+            f"Вы получите уведомление когда она откроется!",
+            name=f"Анонс очереди '{queue_name}'",
+            on_done=self._report_broadcast(queue_info.get("admin_id"))
+        )
+
+    def _register_metrics(self):
+        # Эти значения и так считаются; снимаем их только при запросе /metrics
+        metrics.collector(
+            "queuebot_timers_pending", "Запланированных таймеров: открытия и архивация очередей", "gauge",
+            lambda: sum(len(tenant.scheduler) for tenant in self.tenants)
+        )
+        metrics.collector(
+            "queuebot_leader", "1, если этот процесс ведущий", "gauge",
+            lambda: int(self.leader.is_leader)
+        )
+        metrics.collector(
+            "queuebot_queue_members", "Участников в активных очередях", "gauge",
+            lambda: self._per_queue(lambda store, name: store.member_count(name)),
+            ("tenant", "queue")
+        )
+        metrics.collector(
+            "queuebot_queue_waitlist", "Ждут в листе ожидания активных очередей", "gauge",
+            lambda: self._per_queue(lambda store, name: store.waitlist_count(name)),
+            ("tenant", "queue")
+        )
+        metrics.collector(
+            "queuebot_joins_total", "Заявки на вступление по результату", "counter",
+            lambda: {
+                status: count for status, count in self._summed(lambda t: t.admission.stats).items()
+                if status != "batches"
+            },
+            ("status",)
+        )
+        metrics.collector(
+            "queuebot_join_batches_total", "Пачек заявок, записанных одним коммитом", "counter",
+            lambda: sum(tenant.admission.stats["batches"] for tenant in self.tenants)
+        )
+        metrics.collector(
+            "queuebot_outbox_pending", "Личных уведомлений ждут отправки", "gauge",
+            lambda: len(self.outbox)
+        )
+        metrics.collector(
+            "queuebot_outbox_total", "Личные уведомления: поставлены и заменены более свежими", "counter",
+            lambda: dict(self.outbox.stats), ("result",)
+        )
+        metrics.collector(
+            "queuebot_broadcast_messages_total", "Сообщения рассылок по результату", "counter",
+            lambda: dict(self.broadcaster.stats), ("result",)
+        )
+        metrics.collector(
+            "queuebot_replayed_updates_total", "Повторно доставленные обновления, отброшенные до обработчиков", "counter",
+            lambda: self.dedup.replays
+        )
+        metrics.collector(
+            "queuebot_conversations", "Чатов, от которых бот ждёт ввода", "gauge",
+            lambda: len(self.conversations)
+        )
+        metrics.collector(
+            "queuebot_keyboard_cache_total", "Обращения к кэшу клавиатур", "counter",
+            lambda: self._summed(lambda t: {"hit": t.keyboards.hits, "miss": t.keyboards.misses}),
+            ("result",)
+        )
+        metrics.collector(
+            "queuebot_listing_renders_total", "Составы очередей: готовые, перечитанные, поправленные на месте", "counter",
+            lambda: self._summed(lambda t: t.listings.stats), ("result",)
+        )
+        metrics.collector(
+            "queuebot_board_updates_total", "Обновления живых табло", "counter",
+            lambda: self._summed(lambda t: t.boards.stats), ("result",)
+        )
+        metrics.collector(
+            "queuebot_tenants", "Открытых тенантов", "gauge",
+            lambda: len(self.tenants)
+        )
+
+    def _per_queue(self, count):
+        return {
+            (tenant.id, name): count(tenant.store, name)
+            for tenant in self.tenants for name in tenant.store.active_queues()
+        }
+
+    def _summed(self, stats):
+        total = Counter()
+        for tenant in self.tenants:
+            total.update(stats(tenant))
+        return dict(total)
+
+    def _schedule_queue_opening(self, queue_name, open_time):
+        self.scheduler.schedule(queue_name, open_time.timestamp(), self._open_queue)
+
+    async def _sync_timers(self):
+        # Ведущий сверяет таймеры с хранилищем: при избрании и на каждом продлении роли,
+        # так как очереди (и новые тенанты) могли создать или закрыть другие процессы
+        self.tenants.refresh()
+        for tenant in self.tenants:
+            with self.tenants.use(tenant.id):
+                self._restore_scheduled_openings()
+                self._restore_archiving()
+
+    async def _drop_timers(self):
+        for tenant in self.tenants:
+            tenant.scheduler.clear()
+
+    def _restore_scheduled_openings(self):
+        # Время открытия хранится в данных, поэтому перезапуск его не теряет;
+        # просроченные открытия срабатывают сразу после старта
+        restored = 0
+        for queue_name, open_time in self.store.pending_openings().items():
+            if (self.store.get_queue(queue_name) or {}).get("announce_pending"):
+                self._announce_queue(queue_name)
+            if queue_name not in self.scheduler:
+                self._schedule_queue_opening(queue_name, datetime.fromisoformat(open_time))
+                restored += 1
+        if restored:
+            logger.info(f"Восстановлено запланированных открытий: {restored}")
+
+    def _restore_archiving(self):
+        # Закрытые до перезапуска очереди (и старые, без closed_at) уходят в архив по тому же таймеру
+        now = time.time()
+        restored = 0
+        for queue_name, closed_at in self.store.closed_queues().items():
+            key = ("archive", queue_name)
+            # Сработавший таймер ещё не дошёл до отметки в archiving: его задача уже создана
+            if key in self.scheduler or self.scheduler.is_firing(key) or queue_name in self.tenant.archiving:
+                continue
+            due = datetime.fromisoformat(closed_at).timestamp() + ARCHIVE_AFTER if closed_at else now
+            self.scheduler.schedule(key, due, self._archive_queue)
+            restored += 1
+        if restored:
+            logger.info(f"Закрытых очередей ждут переноса в архив: {restored}")
+
+    async def _archive_queue(self, key):
+        _, queue_name = key
+        queue_info = self.store.get_queue(queue_name)
+        if queue_info is None or queue_info.get("is_active"):
+            return
+        record = {"name": queue_name, "info": queue_info, "members": self.store.members(queue_name)}
+        # Сначала архив, потом удаление: сбой между ними даст дубль в архиве, а не потерю
+        self.tenant.archiving.add(queue_name)
+        try:
+            await asyncio.to_thread(self.archive.append, record)
+            self.store.drop_queue(queue_name)
+        finally:
+            self.tenant.archiving.discard(queue_name)
+        logger.info(f"Очередь '{queue_name}' перенесена в архив ({len(record['members'])} участников)")
+
+    async def show_history(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # /history [часть названия] — закрытые очереди из архива, новые первыми
+        if not self._is_admin(update.effective_user.id):
+            await update.message.reply_text("⛔ У вас нет прав администратора")
+            return
+        query = " ".join(context.args).strip()
+        records = await asyncio.to_thread(self.archive.search, query or None, HISTORY_LIMIT)
+        if not records:
+            await update.message.reply_text("📭 В архиве ничего не найдено")
+            return
+        
+        def closed_at(record):
+            moment = record["info"].get("closed_at") or record["archived_at"]
+            return datetime.fromisoformat(moment).strftime('%d.%m.%Y %H:%M')
+        
+        exact = [r for r in records if r["name"].lower() == query.lower()]
+        if query and exact:
+            record = exact[0]
+            lines = [f"📦 {record['name']}", f"🔒 Закрыта: {closed_at(record)}", ""]
+            lines.extend(f"{m['position']}. {m['username']}" for m in record["members"])
+            if not record["members"]:
+                lines.append("📭 Очередь была пуста")
+        else:
+            lines = ["📦 Архив очередей:", ""]
+            lines.extend(
+                f"{r['name']} — закрыта {closed_at(r)}, участников {len(r['members'])}"
+                for r in records
+            )
+            lines.extend(["", "ℹ️ /history <название> — состав очереди"])
+        text = "\n".join(lines)
+        await update.message.reply_text(text[:4000])
+
+    async def _open_queue(self, queue_name):
+        if not self.store.open_queue(queue_name, datetime.now().isoformat()):
+            return
+        self.boards.touch(queue_name)
+        return await self._notify_queue_opened(queue_name)
+
+    async def _notify_queue_opened(self, queue_name):
+        queue_info = self.store.get_queue(queue_name) or {}
+        return self.broadcaster.broadcast(
+            self.store.subscribers(),
+            f"❗Очередь '{queue_name}' открыта для записи! ❗\n"
+            f"❗Перейдите в меню чтобы присоединиться. ❗",
+            name=f"Открытие очереди '{queue_name}'",
+            on_done=self._report_broadcast(queue_info.get("admin_id"))
+        )
+
+    def _promote(self, queue_name):
+        # Освободившиеся места занимают первые из листа ожидания, без повторных нажатий
+        promoted = self.store.promote_waitlisted(queue_name, MAX_QUEUE_SIZE)
+        if not promoted:
+            return
+        self.listings.appended(queue_name, [(m["position"], m["username"]) for m in promoted])
+        self.boards.touch(queue_name)
+        logger.info(f"Из листа ожидания в очередь '{queue_name}' переведено: {len(promoted)}")
+        pending = self.tenant.promoted.get(queue_name)
+        if pending is None:
+            pending = self.tenant.promoted[queue_name] = []
+            asyncio.get_running_loop().call_later(
+                PROMOTION_NOTIFY_DELAY, self._notify_promoted, queue_name
+            )
+        pending.extend(m["user_id"] for m in promoted)
+
+    def _notify_promoted(self, queue_name):
+        user_ids = self.tenant.promoted.pop(queue_name, [])
+        if user_ids:
+            self.broadcaster.broadcast(
+                user_ids,
+                f"✅ Освободилось место: вы переведены из листа ожидания в очередь '{queue_name}'",
+                name=f"Перевод из листа ожидания '{queue_name}'"
+            )
+
+    def _notify_turns(self, queue_name, from_position):
+        # Выход с позиции from_position сдвинул на одну вперёд всех, кто стоял дальше.
+        # Порог пересёк только тот, кто теперь стоит на нём, — его и читаем, без обхода очереди
+        for position, text in TURN_NOTICES.items():
+            if position < from_position:
+                continue
+            member = self.store.members(queue_name, position - 1, 1)
+            if member:
+                self.outbox.put(member[0]["user_id"], queue_name, text.format(queue=queue_name))
+
+    def _render_board(self, queue_name):
+        queue_info = self.store.get_queue(queue_name) or {}
+        scheduled = queue_info.get("scheduled_open_time")
+        if queue_info.get("is_active"):
+            status = "🟢 Открыта для записи"
+        elif queue_info.get("closed_at") or queue_info.get("opened_at") or not scheduled:
+            # То же правило, что у closed_queues(): без closed_at закрыты и старые очереди
+            status = "🔒 Закрыта"
+        else:
+            open_time = datetime.fromisoformat(scheduled)
+            status = f"⏳ Откроется в {open_time.strftime('%H:%M:%S')}"
+        listing = self.listings.get(queue_name)
+        lines = [
+            f"📺 Очередь: {queue_name}",
+            status,
+            f"👥 {listing.count}/{MAX_QUEUE_SIZE}",
+            "",
+            listing.text if listing.count else "📭 Очередь пуста"
+        ]
+        waiting = self.store.waitlist_count(queue_name)
+        if waiting:
+            lines.extend(["", f"⏳ Лист ожидания: {waiting}"])
+        return "\n".join(lines)
+
+    async def post_board(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # /board <очередь> — поставить живое табло очереди в этот чат (например, в группу)
+        if not self._is_admin(update.effective_user.id):
+            await update.message.reply_text("⛔ У вас нет прав администратора")
+            return
+        queue_name = " ".join(context.args).strip()
+        if not queue_name:
+            await update.message.reply_text("ℹ️ Использование: /board <название очереди>")
+            return
+        if self.store.get_queue(queue_name) is None:
+            await update.message.reply_text("⛔ Очередь не найдена")
+            return
+        await self.boards.post(queue_name, update.effective_chat.id)
+
+    def _report_broadcast(self, admin_id):
+        async def report(job):
+            if admin_id is not None:
+                await self.app.bot.send_message(chat_id=admin_id, text=f"📨 {job.summary()}")
+        return report
+
+    def _catalog_keyboard(self, kind, page):
+        # Список активных очередей; страница пересобирается только после изменения очередей
+        def build():
+            active_queues = self.store.active_queues()
+            if not active_queues:
+                return None
+            names = list(active_queues)
+            current = clamp_page(page, len(names))
+            rows = []
+            for name in names[current * PAGE_SIZE:(current + 1) * PAGE_SIZE]:
+                queue_id = active_queues[name]["id"]
+                if kind == Op.LIST:
+                    count = self.store.member_count(name)
+                    rows.append([InlineKeyboardButton(
+                        f"📌 {name} ({count}/{MAX_QUEUE_SIZE})",
+                        callback_data=encode(Op.DETAILS, queue_id)
+                    )])
+                else:
+                    rows.append([InlineKeyboardButton(name, callback_data=encode(Op.JOIN, queue_id))])
+            return build_paged_keyboard(
+                rows, current, len(names),
+                lambda n: encode(kind, n),
+                [[InlineKeyboardButton("🔙 Назад", callback_data=encode(Op.MAIN))]],
+                noop_callback=encode(Op.NOOP)
+            )
+        return self.keyboards.get_or_build((kind, self.store.version(), page), build)
+
+    def _members_keyboard(self, kind, queue_id, queue_name, page, callback, exclude=None):
+        def build():
+            total = self.store.member_count(queue_name)
+            offset_shift = 0
+            if exclude is not None:
+                total -= 1
+                excluded_position = self.store.position(queue_name, exclude)
+                if excluded_position is not None and excluded_position <= clamp_page(page, total) * PAGE_SIZE:
+                    offset_shift = 1
+            current = clamp_page(page, total)
+            members = self.store.members(
+                queue_name, current * PAGE_SIZE + offset_shift, PAGE_SIZE + 1
+            )
+            rows = [
+                [InlineKeyboardButton(f"{m['position']}. {m['username']}", callback_data=callback(m))]
+                for m in members if m['user_id'] != exclude
+            ][:PAGE_SIZE]
+            if exclude is not None:
+                page_callback = lambda n: encode(kind, queue_id, int(exclude), n)
+            else:
+                page_callback = lambda n: encode(kind, queue_id, n)
+            return build_paged_keyboard(
+                rows, current, total, page_callback,
+                [[InlineKeyboardButton("❌ Отмена", callback_data=encode(Op.DETAILS, queue_id))]],
+                noop_callback=encode(Op.NOOP)
+            )
+        key = (kind, queue_name, self.store.version(queue_name), page, exclude)
+        return self.keyboards.get_or_build(key, build)
+
+    async def _queue_by_id(self, update: Update, context: ContextTypes.DEFAULT_TYPE, queue_id):
+        queue_name = self.store.queue_name(queue_id)
+        if queue_name is None:
+            await self._show_main_menu(update, "⛔ Очередь не найдена")
+        return queue_name
+
+    async def show_join_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, page=0):
+        reply_markup = self._catalog_keyboard(Op.JOIN_MENU, page)
+        
+        if reply_markup is None:
+            await self._show_main_menu(update, "📭 Нет доступных активных очередей")
+            return
+        
+        await self._show(update, "➕ Выберите очередь для присоединения:", reply_markup)
+
+    async def join_queue(self, update: Update, context: ContextTypes.DEFAULT_TYPE, queue_id):
+        query = update.callback_query
+        user = query.from_user
+        
+        queue_name = self.store.queue_name(queue_id)
+        username = await self._get_username(user)
+        # Проверки и запись делает последовательный конвейер, а не обработчик.
+        # Заявка подаётся до первого запроса к API, иначе его задержка перемешает нажатия
+        with tracing.span("admission"):
+            status, position = await self.admission.submit(
+                queue_name, user.id, username, update.update_id, self._op_id(update)
+            )
+        await query.answer()
+        
+        if status == JOINED:
+            self.boards.touch(queue_name)
+            text = f"✅ Вы добавлены в очередь '{queue_name}' на позицию {position}"
+        elif status == WAITLISTED:
+            self.boards.touch(queue_name)
+            text = (
+                f"⏳ Очередь заполнена. Вы в листе ожидания под номером {position} — "
+                f"переведём автоматически, как только освободится место"
+            )
+            if self.store.member_count(queue_name) < MAX_QUEUE_SIZE:
+                self._promote(queue_name)  # Место освободилось, пока заявка шла в лист
+        elif status == DUPLICATE:
+            text = "ℹ️ Вы уже в этой очереди"
+        elif status == FULL:
+            text = f"⛔ Очередь заполнена (максимум {MAX_QUEUE_SIZE})"
+        else:
+            text = "⛔ Очередь не найдена или неактивна"
+        
+        await self._show_main_menu(update, text)
+
+    async def show_leave_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, page=0):
+        user = update.effective_user
+        
+        user_queues = self.store.user_queues(user.id, active_only=True)
+        # Из листа ожидания выходят тем же меню
+        user_queues += [
+            name for name in self.store.waitlisted_queues(user.id)
+            if name not in user_queues and (self.store.get_queue(name) or {}).get("is_active")
+        ]
+        
+        if not user_queues:
+            await self._show_main_menu(update, "📭 Вы не состоите ни в одной очереди")
+            return
+        
+        page = clamp_page(page, len(user_queues))
+        buttons = [
+            [InlineKeyboardButton(name, callback_data=encode(Op.LEAVE, self.store.get_queue(name)["id"]))] 
+            for name in user_queues[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+        ]
+        
+        await self._show(
+            update,
+            "➖ Выберите очередь для выхода:",
+            build_paged_keyboard(
+                buttons, page, len(user_queues),
+                lambda n: encode(Op.LEAVE_MENU, n),
+                [[InlineKeyboardButton("🔙 Назад", callback_data=encode(Op.MAIN))]],
+                noop_callback=encode(Op.NOOP)
+            )
+        )
+
+    async def leave_queue(self, update: Update, context: ContextTypes.DEFAULT_TYPE, queue_id):
+        user = update.effective_user
+        
+        queue_name = await self._queue_by_id(update, context, queue_id)
+        if queue_name is None:
+            return
+        
+        removed_position = self.store.remove_member(queue_name, user.id, self._op_id(update))
+        if removed_position is None:
+            if self.store.remove_waitlisted(queue_name, user.id) is not None:
+                self.boards.touch(queue_name)
+                text = f"✅ Вы покинули лист ожидания очереди '{queue_name}'"
+            else:
+                text = "⛔ Вы не состоите в этой очереди"
+            await self._show_main_menu(update, text)
+            return
+        self.listings.removed(queue_name, removed_position)
+        self.boards.touch(queue_name)
+        self._notify_turns(queue_name, removed_position)
+        self._promote(queue_name)
+        
+        await self._show_main_menu(update, f"✅ Вы вышли из очереди '{queue_name}'")
+
+    async def list_queues(self, update: Update, context: ContextTypes.DEFAULT_TYPE, page=0):
+        reply_markup = self._catalog_keyboard(Op.LIST, page)
+        
+        if reply_markup is None:
+            await self._show_main_menu(update, "📭 Нет активных очередей")
+            return
+        
+        await self._show(update, "📋 Список активных очередей:", reply_markup)
+
+    async def show_queue_details(self, update: Update, context: ContextTypes.DEFAULT_TYPE, queue_id):
+        queue_name = await self._queue_by_id(update, context, queue_id)
+        if queue_name is None:
+            return
+        await self._show_queue_details(update, queue_id, queue_name)
+
+    async def _show_queue_details(self, update: Update, queue_id, queue_name, notice=None):
+        # После действия администратора карточка приходит одной правкой вместе с его итогом
+        user_id = update.effective_user.id
+        with tracing.span("render.details"):
+            listing = self.listings.get(queue_name)
+            message = f"👥 Очередь: {queue_name}\n\n{listing.text}" if listing.count else "📭 Очередь пуста"
+            
+            waiting = self.store.waitlist_count(queue_name)
+            if waiting:
+                message += f"\n\n⏳ Лист ожидания: {waiting}"
+            
+            my_position = self.store.position(queue_name, user_id)
+            if my_position is not None:
+                message += f"\n\n📍 Ваша позиция: {my_position}"
+            else:
+                my_position = self.store.waitlist_position(queue_name, user_id)
+                if my_position is not None:
+                    message += f"\n\n📍 Вы в листе ожидания под номером {my_position}"
+            if notice:
+                message = f"{notice}\n\n{message}"
+            
+            await self._show(update, message, self._details_keyboard(queue_id, self._is_admin(user_id)))
+
+    def _details_keyboard(self, queue_id, is_admin):
+        def build():
+            buttons = []
+            if is_admin:
+                buttons.append([
+                    InlineKeyboardButton("🔄 Поменять местами", callback_data=encode(Op.SWAP_MENU, queue_id, 0)),
+                    InlineKeyboardButton("🗑️ Удалить участника", callback_data=encode(Op.REMOVE_MENU, queue_id, 0))
+                ])
+                buttons.append([
+                    InlineKeyboardButton("⏭ Следующий", callback_data=encode(Op.NEXT, queue_id)),
+                    InlineKeyboardButton("🔒 Закрыть очередь", callback_data=encode(Op.CLOSE, queue_id))
+                ])
+            buttons.append([InlineKeyboardButton("🔙 Назад", callback_data=encode(Op.LIST, 0))])
+            return InlineKeyboardMarkup(buttons)
+        # Кнопки карточки зависят только от очереди и роли
+        return self.keyboards.get_or_build((Op.DETAILS, queue_id, is_admin), build)
+
+    async def show_swap_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, queue_id, page):
+        queue_name = await self._queue_by_id(update, context, queue_id)
+        if queue_name is None:
+            return
+        
+        if self.store.member_count(queue_name) < 2:
+            await self._show_queue_details(update, queue_id, queue_name, "⚠️ Нужно минимум 2 участника для обмена")
+            return
+        
+        reply_markup = self._members_keyboard(
+            Op.SWAP_MENU, queue_id, queue_name, page,
+            lambda m: encode(Op.SWAP_FIRST, queue_id, int(m['user_id']), 0)
+        )
+        
+        await self._show(update, "Выберите первого участника для обмена:", reply_markup)
+
+    async def select_second_for_swap(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                     queue_id, first_user_id, page):
+        queue_name = await self._queue_by_id(update, context, queue_id)
+        if queue_name is None:
+            return
+        
+        reply_markup = self._members_keyboard(
+            Op.SWAP_FIRST, queue_id, queue_name, page,
+            lambda m: encode(Op.SWAP_SECOND, queue_id, first_user_id, int(m['user_id'])),
+            exclude=str(first_user_id)
+        )
+        
+        await self._show(update, "Выберите второго участника для обмена:", reply_markup)
+
+    async def process_swap(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                           queue_id, first_user_id, second_user_id):
+        queue_name = await self._queue_by_id(update, context, queue_id)
+        if queue_name is None:
+            return
+        
+        swapped = self.store.swap_members(
+            queue_name, first_user_id, second_user_id, self._op_id(update)
+        )
+        if swapped is None:
+            await self._show_queue_details(update, queue_id, queue_name, "⛔ Участник не найден")
+            return
+        first_pos, second_pos = swapped
+        self.listings.swapped(queue_name, first_pos, second_pos)
+        self.boards.touch(queue_name)
+        for user_id, position in ((first_user_id, second_pos), (second_user_id, first_pos)):
+            if position in TURN_NOTICES:
+                self.outbox.put(user_id, queue_name, TURN_NOTICES[position].format(queue=queue_name))
+        
+        await self._show_queue_details(
+            update, queue_id, queue_name, f"✅ Позиции {first_pos} и {second_pos} успешно поменяны местами"
+        )
+
+    async def show_remove_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, queue_id, page):
+        queue_name = await self._queue_by_id(update, context, queue_id)
+        if queue_name is None:
+            return
+        
+        reply_markup = self._members_keyboard(
+            Op.REMOVE_MENU, queue_id, queue_name, page,
+            lambda m: encode(Op.REMOVE, queue_id, int(m['user_id']))
+        )
+        
+        await self._show(update, "Выберите участника для удаления:", reply_markup)
+
+    async def process_remove(self, update: Update, context: ContextTypes.DEFAULT_TYPE, queue_id, user_id):
+        queue_name = await self._queue_by_id(update, context, queue_id)
+        if queue_name is None:
+            return
+        
+        removed_position = self.store.remove_member(queue_name, user_id, self._op_id(update))
+        if removed_position is None:
+            await self._show_queue_details(update, queue_id, queue_name, "⛔ Участник не найден")
+            return
+        self.listings.removed(queue_name, removed_position)
+        self.boards.touch(queue_name)
+        self._notify_turns(queue_name, removed_position)
+        self._promote(queue_name)
+        
+        await self._show_queue_details(
+            update, queue_id, queue_name, f"✅ Участник на позиции {removed_position} удален из очереди"
+        )
+
+    async def advance_queue(self, update: Update, context: ContextTypes.DEFAULT_TYPE, queue_id):
+        # Вызывает первого в очереди; остальные узнают о продвижении только на порогах TURN_NOTICES
+        queue_name = await self._queue_by_id(update, context, queue_id)
+        if queue_name is None:
+            return
+        
+        called = self.store.advance_queue(queue_name, self._op_id(update))
+        if called is None:
+            await self._show_queue_details(update, queue_id, queue_name, "📭 Очередь пуста")
+            return
+        self.listings.removed(queue_name, 1)
+        self.boards.touch(queue_name)
+        self.outbox.put(called["user_id"], queue_name, f"🔔 Подошла ваша очередь в '{queue_name}'")
+        self._notify_turns(queue_name, 1)
+        self._promote(queue_name)
+        
+        await self._show_queue_details(update, queue_id, queue_name, f"⏭ Вызван {called['username']}")
+
+    async def close_queue(self, update: Update, context: ContextTypes.DEFAULT_TYPE, queue_id):
+        queue_name = await self._queue_by_id(update, context, queue_id)
+        if queue_name is None:
+            return
+        
+        if self.store.close_queue(queue_name, datetime.now().isoformat()):
+            self.scheduler.cancel(queue_name)
+            if self.leader.is_leader:
+                self.scheduler.schedule(("archive", queue_name), time.time() + ARCHIVE_AFTER, self._archive_queue)
+            # В закрытую очередь переводить некуда: лист распускается одним уведомлением
+            waiting = self.store.clear_waitlist(queue_name)
+            if waiting:
+                self.broadcaster.broadcast(
+                    waiting,
+                    f"🔒 Очередь '{queue_name}' закрыта, место из листа ожидания не освободилось",
+                    name=f"Закрытие листа ожидания '{queue_name}'"
+                )
+            self.boards.touch(queue_name)
+            await self._show_main_menu(update, f"✅ Очередь '{queue_name}' закрыта")
+
+    async def noop(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        pass
+
+    def _init_callback_routes(self):
+        # Код операции из callback_data -> обработчик; аргументы уже разобраны кодеком
+        self.callback_routes = {
+            Op.MAIN: self.start,
+            Op.LIST: self.list_queues,
+            Op.JOIN_MENU: self.show_join_menu,
+            Op.LEAVE_MENU: self.show_leave_menu,
+            Op.MANAGE: self.manage_queues_menu,
+            Op.CREATE: self.create_queue_input,
+            Op.NOOP: self.noop,
+            Op.JOIN: self.join_queue,
+            Op.LEAVE: self.leave_queue,
+            Op.DETAILS: self.show_queue_details,
+            Op.SWAP_MENU: self.show_swap_menu,
+            Op.SWAP_FIRST: self.select_second_for_swap,
+            Op.SWAP_SECOND: self.process_swap,
+            Op.REMOVE_MENU: self.show_remove_menu,
+            Op.REMOVE: self.process_remove,
+            Op.CLOSE: self.close_queue,
+            Op.NEXT: self.advance_queue,
+        }
+
+    async def select_tenant(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # Группа -3: очереди группового чата живут в его тенанте, личные чаты — в общем
+        chat = update.effective_chat
+        if chat is not None and chat.type in (Chat.GROUP, Chat.SUPERGROUP):
+            self.tenants.enter(str(chat.id))
+            tracing.annotate(tenant=str(chat.id))
+        else:
+            self.tenants.enter(DEFAULT_TENANT)
+
+    async def drop_replayed_updates(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # Группа -2: повторно доставленное обновление (перезапуск, сбой сети) не доходит до обработчиков.
+        # На повторное нажатие не отвечаем — ответ на него уже ушёл
+        query_id = update.callback_query.id if update.callback_query else None
+        if not self.dedup.check(f"u:{update.update_id}", query_id and f"c:{query_id}"):
+            logger.info(f"Повтор обновления {update.update_id} отброшен")
+            raise ApplicationHandlerStop
+
+    def _op_id(self, update):
+        # Id операции — id нажатия: повтор того же нажатия хранилище не выполнит второй раз
+        return f"cb:{update.callback_query.id}"
+
+    async def throttle_callbacks(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # Группа -1: отсечённое нажатие получает только всплывающий ответ и дальше не идёт
+        query = update.callback_query
+        try:
+            idempotent = decode(query.data)[0] not in REPEATABLE_OPS
+        except CallbackDataError:
+            idempotent = True  # Испорченные данные button_handler всё равно только отклонит
+        # Одинаковые callback_data в разных группах — разные кнопки: тенант входит в ключ повтора
+        verdict = self.throttle.check(query.from_user.id, (self.tenant.id, query.data), idempotent)
+        if verdict is None:
+            return
+        if verdict == REPEATED:
+            await query.answer("⏳ Уже обрабатываем это нажатие")
+        else:
+            await query.answer("⏳ Слишком много нажатий, подождите пару секунд")
+        raise ApplicationHandlerStop
+
+    async def button_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        
+        try:
+            op, args = decode(query.data)
+        except CallbackDataError as e:
+            # Кнопки старого формата или испорченные данные: просто показываем меню заново
+            logger.info(f"Отклонены callback_data {query.data!r}: {e}")
+            CALLBACK_REJECTED.inc()
+            await query.answer()
+            await self.start(update, context)
+            return
+        
+        started = time.perf_counter()
+        tracing.annotate(op=op.name.lower())
+        try:
+            with tracing.span("handler." + op.name.lower()):
+                # Ответ на нажатие — один на обработчик; итог действия приходит в правке сообщения.
+                # join_queue отвечает сам, уже после подачи заявки
+                if op != Op.JOIN:
+                    await query.answer()
+                if op in ADMIN_OPS and not self._is_admin(query.from_user.id):
+                    logger.warning(f"Нажатие {op.name} от не-админа {query.from_user.id} отклонено")
+                    await self._show_main_menu(update, "⛔ У вас нет прав администратора")
+                    return
+                await self.callback_routes[op](update, context, *args)
+        finally:
+            CALLBACK_SECONDS.observe(time.perf_counter() - started, op.name.lower())
+
+    async def toggle_trace(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # /trace on|off — трассы обновлений в TRACE_FILE; без аргумента — текущее состояние
+        if not self._is_admin(update.effective_user.id):
+            await update.message.reply_text("⛔ У вас нет прав администратора")
+            return
+        mode = context.args[0].lower() if context.args else None
+        if mode == "on":
+            tracing.enable(TRACE_FILE)
+        elif mode == "off":
+            tracing.disable()
+        elif mode is not None:
+            await update.message.reply_text("ℹ️ Использование: /trace on|off")
+            return
+        state = "включена" if tracing.enabled() else "выключена"
+        await update.message.reply_text(f"🔎 Трассировка {state} ({TRACE_FILE})")
+
+    async def start_profile(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # /profile [секунды] — cProfile цикла событий за окно; сводка придёт по окончании
+        if not self._is_admin(update.effective_user.id):
+            await update.message.reply_text("⛔ У вас нет прав администратора")
+            return
+        try:
+            seconds = int(context.args[0]) if context.args else PROFILE_SECONDS
+        except ValueError:
+            await update.message.reply_text("ℹ️ Использование: /profile [секунды]")
+            return
+        if self._profile_task is not None and not self._profile_task.done():
+            await update.message.reply_text("⏳ Профилирование уже идёт")
+            return
+        seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+        await update.message.reply_text(f"⏱ Профилирую {seconds} с")
+        # Окно идёт фоновой задачей: обработчик не держит очередь обновлений администратора
+        self._profile_task = asyncio.get_running_loop().create_task(
+            self._profile_window(update.effective_chat.id, seconds)
+        )
+
+    async def _profile_window(self, chat_id, seconds):
+        path, summary = await tracing.profile(seconds, PROFILE_DIR)
+        if path is None:
+            text = f"⛔ {summary}"
+        else:
+            logger.info(f"Профиль за {seconds} с сохранён в {path}")
+            text = f"📊 Профиль за {seconds} с: {path}\n\n{summary}"
+        await self.app.bot.send_message(chat_id=chat_id, text=text[:4000])
+
+    async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        logger.error("Ошибка:", exc_info=context.error)
+        if update.callback_query:
+            await update.callback_query.answer("⛔ Произошла ошибка")
+        await self.start(update, context)
+
+    def _init_handlers(self):
+        self.app.add_handler(CommandHandler("start", self.start))
+        self.app.add_handler(CommandHandler("list_queues", self.list_queues))
+        self.app.add_handler(CommandHandler("join_queue", self.show_join_menu))
+        self.app.add_handler(CommandHandler("leave_queue", self.show_leave_menu))
+        self.app.add_handler(CommandHandler("board", self.post_board))
+        self.app.add_handler(CommandHandler("history", self.show_history))
+        self.app.add_handler(CommandHandler("trace", self.toggle_trace))
+        self.app.add_handler(CommandHandler("profile", self.start_profile))
+        
+        self.app.add_handler(MessageHandler(
+            filters.TEXT & ~filters.COMMAND & (filters.ChatType.PRIVATE | filters.ChatType.GROUPS),
+            self.create_queue_process
+        ))
+        
+        self.app.add_handler(TypeHandler(Update, self.select_tenant), group=-3)
+        self.app.add_handler(TypeHandler(Update, self.drop_replayed_updates), group=-2)
+        self.app.add_handler(CallbackQueryHandler(self.throttle_callbacks), group=-1)
+        self.app.add_handler(CallbackQueryHandler(self.button_handler))
+        
+        self.app.add_error_handler(self.error_handler)
+
+    async def _run_webhook(self):
+        webhook = WebhookApp(self.app, WEBHOOK_PATH, WEBHOOK_SECRET)
+        # run_webhook/run_polling сами вызывают post_init, post_stop и post_shutdown, здесь — мы
+        await self.app.initialize()
+        try:
+            await self._post_init(self.app)
+            if WEBHOOK_URL:
+                await self.app.bot.set_webhook(
+                    url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+                    secret_token=WEBHOOK_SECRET,
+                    allowed_updates=Update.ALL_TYPES,
+                    max_connections=100
+                )
+            await self.app.start()
+            logger.info(f"Вебхук слушает {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH}")
+            try:
+                await serve(webhook, WEBHOOK_LISTEN, WEBHOOK_PORT)
+            finally:
+                webhook.begin_drain()
+                # stop() дожидается обработки всех уже принятых обновлений
+                await self.app.stop()
+                logger.info(f"Вебхук остановлен: принято {webhook.stats['accepted']}, "
+                            f"отклонено при остановке {webhook.stats['rejected']}")
+        finally:
+            await self._post_stop(self.app)
+            await self._post_shutdown(self.app)
+            await self.app.shutdown()
+
+    def run(self):
+        logger.info("Бот запускается...")
+        if RUN_MODE == "webhook":
+            asyncio.run(self._run_webhook())
+        else:
+            self.app.run_polling()
+
+if __name__ == '__main__':
+    bot = QueueBot()
+    bot.run()
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+import metrics
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+SEND_SECONDS = metrics.Histogram("queuebot_broadcast_send_seconds", "Длительность одного sendMessage рассылки")
+SEND_FAILURES = metrics.Counter(
+    "queuebot_broadcast_failures_total", "Неудачные попытки отправки рассылки по причинам", ("reason",)
+)
+
+BROADCAST_CONCURRENCY = 16  # Одновременных запросов к Bot API
+GLOBAL_RATE = 25  # Сообщений в секунду на бота (лимит Telegram около 30)
+PER_CHAT_RATE = 1  # Сообщений в секунду в один чат
+MAX_ATTEMPTS = 3
+PROGRESS_EVERY = 500
+MAX_CHAT_BUCKETS = 10000
+OUTBOX_RATE = 10  # Личных уведомлений в секунду; остаток общего лимита — рассылкам
+
+# Ответы Bot API, после которых писать в чат бессмысленно
+DEAD_CHAT_ERRORS = ("chat not found", "user is deactivated", "bot was blocked")
+
+
+class BroadcastJob:
+    def __init__(self, name, total):
+        self.name = name
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.blocked = 0
+        self.retries = 0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.done = asyncio.Event()
+
+    @property
+    def processed(self):
+        return self.sent + self.failed + self.blocked
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def summary(self):
+        return (
+            f"{self.name}: доставлено {self.sent}/{self.total}, "
+            f"заблокировали бота {self.blocked}, ошибок {self.failed}, "
+            f"повторов {self.retries}, за {self.elapsed:.1f} с"
+        )
+
+
+class Broadcaster:
+    def __init__(self, bot, store,
+                 concurrency=BROADCAST_CONCURRENCY,
+                 global_rate=GLOBAL_RATE,
+                 per_chat_rate=PER_CHAT_RATE,
+                 max_attempts=MAX_ATTEMPTS):
+        self.bot = bot
+        self.store = store
+        self.concurrency = concurrency
+        self.per_chat_rate = per_chat_rate
+        self.max_attempts = max_attempts
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_buckets = {}
+        self.stats = {"sent": 0, "failed": 0, "blocked": 0, "retries": 0}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._paused_until = 0.0
+        self._tasks = set()
+
+    def broadcast(self, chat_ids, text, name="Рассылка", on_done=None):
+        # Рассылка идёт фоновой задачей, обработчик не ждёт её окончания
+        chat_ids = list(dict.fromkeys(chat_ids))
+        job = BroadcastJob(name, len(chat_ids))
+        task = asyncio.get_running_loop().create_task(self._run(job, chat_ids, text, on_done))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self, job, chat_ids, text, on_done):
+        pending = asyncio.Queue()
+        for chat_id in chat_ids:
+            pending.put_nowait(chat_id)
+
+        workers = min(self.concurrency, len(chat_ids))
+        await asyncio.gather(*(self._worker(job, pending, text) for _ in range(workers)))
+
+        job.finished_at = time.monotonic()
+        job.done.set()
+        logger.info(job.summary())
+        if on_done is not None:
+            try:
+                await on_done(job)
+            except Exception as e:
+                logger.error(f"Ошибка в обработчике завершения рассылки: {e}")
+
+    async def _worker(self, job, pending, text):
+        while True:
+            try:
+                chat_id = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await self._deliver(job, chat_id, text)
+            if job.processed % PROGRESS_EVERY == 0:
+                logger.info(f"{job.name}: обработано {job.processed}/{job.total}")
+
+    async def _wait_turn(self, chat_id):
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause <= 0:
+                break
+            await asyncio.sleep(pause)
+
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= MAX_CHAT_BUCKETS:
+                self._prune_chat_buckets()
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, 1)
+        await bucket.acquire()
+        await self.global_bucket.acquire()
+
+    def _prune_chat_buckets(self):
+        for chat_id in [c for c, b in self.chat_buckets.items() if b.is_full()]:
+            del self.chat_buckets[chat_id]
+
+    def _pause(self, seconds):
+        # 429 относится ко всему боту, поэтому тормозим всех воркеров сразу
+        if isinstance(seconds, timedelta):
+            seconds = seconds.total_seconds()
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _count(self, job, key):
+        setattr(job, key, getattr(job, key) + 1)
+        self.stats[key] += 1
+
+    async def _deliver(self, job, chat_id, text):
+        for attempt in range(1, self.max_attempts + 1):
+            await self._wait_turn(chat_id)
+            try:
+                async with self._semaphore:
+                    started = time.perf_counter()
+                    await self.bot.send_message(chat_id=chat_id, text=text)
+                    SEND_SECONDS.observe(time.perf_counter() - started)
+                self._count(job, "sent")
+                return
+            except RetryAfter as e:
+                SEND_FAILURES.inc("retry_after")
+                self._count(job, "retries")
+                self._pause(e.retry_after)
+            except Forbidden as e:
+                SEND_FAILURES.inc("forbidden")
+                self._mark_dead(job, chat_id, e)
+                return
+            except BadRequest as e:
+                if any(reason in e.message.lower() for reason in DEAD_CHAT_ERRORS):
+                    SEND_FAILURES.inc("dead_chat")
+                    self._mark_dead(job, chat_id, e)
+                else:
+                    SEND_FAILURES.inc("bad_request")
+                    logger.error(f"Не удалось отправить уведомление пользователю {chat_id}: {e}")
+                    self._count(job, "failed")
+                return
+            except NetworkError:
+                SEND_FAILURES.inc("network")
+                self._count(job, "retries")
+                await asyncio.sleep(2 ** attempt)
+            except Exception as e:
+                SEND_FAILURES.inc("other")
+                logger.error(f"Не удалось отправить уведомление пользователю {chat_id}: {e}")
+                self._count(job, "failed")
+                return
+
+        SEND_FAILURES.inc("attempts_exhausted")
+        logger.error(f"Не удалось отправить уведомление пользователю {chat_id}: попытки исчерпаны")
+        self._count(job, "failed")
+
+    def _mark_dead(self, job, chat_id, error):
+        logger.info(f"Пользователь {chat_id} недоступен ({error}), исключён из рассылок")
+        self.store.block_user(chat_id)
+        self._count(job, "blocked")
+
+
+class Outbox:
+    """Личные уведомления с объединением и своим ограничением скорости.
+
+    На каждую пару (чат, ключ) хранится только последнее неотправленное
+    сообщение: если позиция сменилась дважды до отправки, уйдёт одно,
+    свежее. Доставка общая с Broadcaster — те же лимиты на чат и на бота,
+    пауза после 429 и исключение заблокировавших бота.
+    """
+
+    def __init__(self, broadcaster, rate=OUTBOX_RATE):
+        self.broadcaster = broadcaster
+        self.bucket = TokenBucket(rate)
+        self.stats = {"queued": 0, "coalesced": 0}
+        self.job = BroadcastJob("Личные уведомления", 0)
+        self._pending = {}  # (chat_id, ключ) -> текст, в порядке постановки
+        self._wakeup = None
+        self._task = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._pending:
+            logger.warning(f"Не отправлено личных уведомлений при остановке: {len(self._pending)}")
+
+    def put(self, chat_id, key, text):
+        slot = (str(chat_id), key)
+        if slot in self._pending:
+            self.stats["coalesced"] += 1  # Место в очереди отправки прежнее, текст новый
+        else:
+            self.stats["queued"] += 1
+        self._pending[slot] = text
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                # Сообщение забираем только когда есть токен: до этого его ещё можно заменить
+                await self.bucket.acquire()
+                slot, text = next(iter(self._pending.items()))
+                del self._pending[slot]
+                self.job.total += 1
+                await self.broadcaster._deliver(self.job, slot[0], text)
@@ -0,0 +1,121 @@
+import base64
+from enum import IntEnum
+
+
+class Op(IntEnum):
+    MAIN = 0
+    LIST = 1  # (page)
+    JOIN_MENU = 2  # (page)
+    LEAVE_MENU = 3  # (page)
+    MANAGE = 4
+    CREATE = 5
+    NOOP = 6
+    JOIN = 7  # (queue_id)
+    LEAVE = 8  # (queue_id)
+    DETAILS = 9  # (queue_id)
+    SWAP_MENU = 10  # (queue_id, page)
+    SWAP_FIRST = 11  # (queue_id, first_user_id, page)
+    SWAP_SECOND = 12  # (queue_id, first_user_id, second_user_id)
+    REMOVE_MENU = 13  # (queue_id, page)
+    REMOVE = 14  # (queue_id, user_id)
+    CLOSE = 15  # (queue_id)
+    NEXT = 16  # (queue_id)
+
+
+ARITY = {
+    Op.MAIN: 0, Op.LIST: 1, Op.JOIN_MENU: 1, Op.LEAVE_MENU: 1,
+    Op.MANAGE: 0, Op.CREATE: 0, Op.NOOP: 0,
+    Op.JOIN: 1, Op.LEAVE: 1, Op.DETAILS: 1,
+    Op.SWAP_MENU: 2, Op.SWAP_FIRST: 3, Op.SWAP_SECOND: 3,
+    Op.REMOVE_MENU: 2, Op.REMOVE: 2, Op.CLOSE: 1, Op.NEXT: 1,
+}
+
+# Операции только для админов. callback_data собирается и на клиенте,
+# поэтому скрытой кнопки мало: права проверяются при разборе нажатия
+ADMIN_OPS = frozenset({
+    Op.MANAGE, Op.CREATE,
+    Op.SWAP_MENU, Op.SWAP_FIRST, Op.SWAP_SECOND,
+    Op.REMOVE_MENU, Op.REMOVE, Op.CLOSE, Op.NEXT,
+})
+
+# Повтор этих нажатий меняет очередь ещё раз (следующий вызванный, обратный обмен),
+# поэтому он намеренный и дребезгом не считается
+REPEATABLE_OPS = frozenset({Op.NEXT, Op.SWAP_SECOND})
+
+MAX_CALLBACK_BYTES = 64  # Ограничение Telegram на callback_data
+
+
+class CallbackDataError(ValueError):
+    pass
+
+
+def _checksum(payload):
+    # Отсекает старые строковые callback_data и случайно совпавший мусор
+    return (sum(payload) & 0xFF) ^ 0xA5
+
+
+def _write_varint(out, value):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _read_varint(raw, pos):
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(raw) or shift > 63:
+            raise CallbackDataError("обрезанное число")
+        byte = raw[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode(op, *args):
+    """Код операции и неотрицательные целые аргументы -> короткая base64url-строка."""
+    if len(args) != ARITY[op]:
+        raise CallbackDataError(f"{op.name}: ожидалось {ARITY[op]} аргументов, получено {len(args)}")
+    out = bytearray([op])
+    for arg in args:
+        arg = int(arg)
+        if arg < 0:
+            raise CallbackDataError(f"{op.name}: отрицательный аргумент {arg}")
+        _write_varint(out, arg)
+    out.append(_checksum(out))
+    data = base64.urlsafe_b64encode(bytes(out)).rstrip(b"=").decode("ascii")
+    if len(data) > MAX_CALLBACK_BYTES:
+        raise CallbackDataError(f"{op.name}: callback_data длиннее {MAX_CALLBACK_BYTES} байт")
+    return data
+
+
+def decode(data):
+    if not data or len(data) > MAX_CALLBACK_BYTES:
+        raise CallbackDataError("пустые или слишком длинные данные")
+    try:
+        raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+    except (ValueError, TypeError) as e:
+        raise CallbackDataError(f"не base64: {e}") from None
+    if len(raw) < 2 or raw[-1] != _checksum(raw[:-1]):
+        raise CallbackDataError("неверная контрольная сумма")
+    raw = raw[:-1]
+    try:
+        op = Op(raw[0])
+    except ValueError:
+        raise CallbackDataError(f"неизвестная операция {raw[0]}") from None
+
+    args = []
+    pos = 1
+    for _ in range(ARITY[op]):
+        value, pos = _read_varint(raw, pos)
+        args.append(value)
+    if pos != len(raw):
+        raise CallbackDataError("лишние байты после аргументов")
+    return op, args
@@ -0,0 +1,50 @@
+import time
+
+CONVERSATION_TTL = 600  # Через сколько секунд забываем незавершённый диалог
+
+WAITING_QUEUE_NAME = "waiting_queue_name"
+
+
+class ConversationStates:
+    """Состояние диалога по каждому чату отдельно, с истечением по времени.
+
+    Словарь упорядочен по времени истечения: при каждой установке запись
+    переносится в конец, поэтому просроченные всегда лежат в начале и
+    вычищаются без полного обхода.
+    """
+
+    def __init__(self, ttl=CONVERSATION_TTL):
+        self.ttl = ttl
+        self._states = {}  # chat_id -> (state, expires_at)
+
+    def __len__(self):
+        self._prune()
+        return len(self._states)
+
+    def set(self, chat_id, state):
+        self._states.pop(chat_id, None)
+        self._states[chat_id] = (state, time.monotonic() + self.ttl)
+        self._prune()
+
+    def get(self, chat_id):
+        entry = self._states.get(chat_id)
+        if entry is None:
+            return None
+        state, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._states[chat_id]
+            return None
+        return state
+
+    def pop(self, chat_id):
+        entry = self._states.pop(chat_id, None)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    def _prune(self):
+        now = time.monotonic()
+        for chat_id, (_, expires_at) in list(self._states.items()):
+            if expires_at > now:
+                break
+            del self._states[chat_id]
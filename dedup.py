@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import os
+import time
+
+from storage.writer import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+DEDUP_TTL = 24 * 3600  # Telegram держит неподтверждённые обновления до суток
+DEDUP_MAX_KEYS = 50000
+DEDUP_SAVE_INTERVAL = 30  # Как часто сбрасывать окно на диск, помимо остановки
+
+
+class UpdateDeduplicator:
+    """Окно уже обработанных обновлений: update_id и id нажатий.
+
+    Словарь упорядочен по времени добавления, поэтому самые старые ключи
+    лежат в начале и вычищаются без полного обхода — по сроку или когда
+    ключей больше max_keys. Время — unix timestamp, чтобы окно можно было
+    сохранить в файл и продолжить после перезапуска.
+    """
+
+    def __init__(self, path=None, ttl=DEDUP_TTL, max_keys=DEDUP_MAX_KEYS,
+                 save_interval=DEDUP_SAVE_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.save_interval = save_interval
+        self.replays = 0
+        self._seen = {}  # ключ -> когда обработали
+        self._dirty = False
+        self._task = None
+        self._saving = None  # Фоновая запись в потоке; close её дожидается
+
+    def start(self):
+        self.load()
+        if self.path is not None:
+            self._task = asyncio.get_running_loop().create_task(self._save_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._saving is not None:
+            await asyncio.gather(self._saving, return_exceptions=True)
+        self.save()
+
+    async def _save_loop(self):
+        while True:
+            await asyncio.sleep(self.save_interval)
+            if self._dirty:
+                # Сериализуем здесь, а пишем в потоке, чтобы диск не задерживал обновления
+                self._dirty = False
+                self._saving = asyncio.ensure_future(
+                    asyncio.to_thread(self._write, dumps(list(self._seen.items())))
+                )
+                await asyncio.shield(self._saving)
+
+    def __len__(self):
+        return len(self._seen)
+
+    def check(self, *keys):
+        # True — обновление новое (и теперь запомнено), False — повтор уже обработанного
+        now = time.time()
+        self._prune(now)
+        if any(key in self._seen for key in keys if key is not None):
+            self.replays += 1
+            return False
+        for key in keys:
+            if key is not None:
+                self._seen[key] = now
+        self._dirty = True
+        return True
+
+    def _prune(self, now):
+        expired = now - self.ttl
+        while self._seen:
+            key = next(iter(self._seen))
+            if self._seen[key] > expired and len(self._seen) <= self.max_keys:
+                break
+            del self._seen[key]
+
+    def load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                self._seen = dict(loads(f.read()))
+        except Exception as e:
+            # Окно — только защита от повторов; без него бот работает как раньше
+            logger.error(f"Не удалось прочитать окно обработанных обновлений {self.path}: {e}")
+            return
+        self._prune(time.time())
+
+    def save(self):
+        if self.path is None:
+            return
+        self._dirty = False
+        self._write(dumps(list(self._seen.items())))
+
+    def _write(self, payload):
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить окно обработанных обновлений {self.path}: {e}")
@@ -0,0 +1,61 @@
+from collections import OrderedDict
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+PAGE_SIZE = 8  # Строк с элементами на одной странице клавиатуры
+CACHE_SIZE = 1024
+
+
+_MISSING = object()
+
+
+class KeyboardCache:
+    """LRU готовых клавиатур.
+
+    Версия очереди входит в ключ, поэтому после изменения очереди старые
+    страницы просто перестают запрашиваться и со временем вытесняются.
+    """
+
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get_or_build(self, key, build):
+        markup = self._entries.get(key, _MISSING)
+        if markup is not _MISSING:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return markup
+        self.misses += 1
+        markup = build()
+        self._entries[key] = markup
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return markup
+
+
+def page_count(total, page_size=PAGE_SIZE):
+    return max(1, (total + page_size - 1) // page_size)
+
+
+def clamp_page(page, total, page_size=PAGE_SIZE):
+    return min(max(page, 0), page_count(total, page_size) - 1)
+
+
+def build_paged_keyboard(rows, page, total, page_callback, footer,
+                         page_size=PAGE_SIZE, noop_callback=None):
+    # rows — кнопки только текущей страницы; page_callback(n) даёт callback_data страницы n
+    buttons = [list(row) for row in rows]
+    pages = page_count(total, page_size)
+    if pages > 1:
+        nav = []
+        if page > 0:
+            nav.append(InlineKeyboardButton("◀️", callback_data=page_callback(page - 1)))
+        nav.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data=noop_callback or page_callback(page)))
+        if page < pages - 1:
+            nav.append(InlineKeyboardButton("▶️", callback_data=page_callback(page + 1)))
+        buttons.append(nav)
+    buttons.extend(footer)
+    return InlineKeyboardMarkup(buttons)
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = "leader"
+LEASE_TTL = 15  # Сколько секунд роль держится без продления: за это время её подхватит другой процесс
+LEASE_RENEW_INTERVAL = 5
+
+
+class LeaderElection:
+    """Роль ведущего среди процессов, работающих с одним хранилищем.
+
+    Роль — аренда в хранилище, которую ведущий продлевает каждые
+    renew_interval секунд. Упавший процесс перестаёт продлевать, и через
+    ttl аренду забирает следующий. on_elected и on_lost вызываются при
+    смене роли, on_renewed — на каждом продлении у ведущего.
+    """
+
+    def __init__(self, store, holder, on_elected=None, on_lost=None, on_renewed=None,
+                 name=LEASE_NAME, ttl=LEASE_TTL, renew_interval=LEASE_RENEW_INTERVAL):
+        self.store = store
+        self.holder = holder
+        self.on_elected = on_elected
+        self.on_lost = on_lost
+        self.on_renewed = on_renewed
+        self.name = name
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self.is_leader = False
+        self._task = None
+
+    async def start(self):
+        # Первая попытка — сразу, чтобы единственный процесс стал ведущим ещё до приёма обновлений
+        await self._tick()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self.is_leader:
+            self.is_leader = False
+            try:
+                self.store.release_lease(self.name, self.holder)  # Следующему не ждать истечения ttl
+            except Exception as e:
+                logger.error(f"Не удалось освободить роль ведущего: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.renew_interval)
+            await self._tick()
+
+    async def _tick(self):
+        try:
+            acquired = self.store.acquire_lease(self.name, self.holder, self.ttl)
+        except Exception as e:
+            # Не смогли продлить — считаем, что роль потеряна: другой процесс мог её уже забрать
+            logger.error(f"Ошибка при продлении роли ведущего: {e}")
+            acquired = False
+
+        if acquired and not self.is_leader:
+            self.is_leader = True
+            logger.info(f"Процесс {self.holder} стал ведущим")
+            await self._call(self.on_elected)
+        elif not acquired and self.is_leader:
+            self.is_leader = False
+            logger.warning(f"Процесс {self.holder} больше не ведущий")
+            await self._call(self.on_lost)
+        elif acquired:
+            await self._call(self.on_renewed)
+
+    async def _call(self, callback):
+        if callback is None:
+            return
+        try:
+            await callback()
+        except Exception as e:
+            logger.error(f"Ошибка при смене роли ведущего: {e}")
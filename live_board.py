@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import timedelta
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+BOARD_EDIT_DELAY = 1.0  # Сколько ждём после изменения, собирая остальные в одну правку
+BOARD_MIN_INTERVAL = 3.0  # Не чаще одной правки табло за столько секунд (лимиты на группы)
+MAX_BOARD_LENGTH = 4096
+
+# Сообщение табло удалили или бота убрали из чата — править больше нечего
+GONE_ERRORS = ("message to edit not found", "chat not found", "message can't be edited")
+
+
+def _digest(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class QueueBoards:
+    """Живые табло очередей: одно сообщение на очередь, которое правится на месте.
+
+    Изменения только помечают очередь; правку делает отдельная задача на
+    очередь после короткой паузы, так что пачка вступлений превращается в
+    одну-две правки. Если отрисованный текст не изменился, запрос не шлётся.
+    Где стоит табло, хранится в описании очереди ("board").
+    """
+
+    def __init__(self, bot, store, render, delay=BOARD_EDIT_DELAY, min_interval=BOARD_MIN_INTERVAL):
+        self.bot = bot
+        self.store = store
+        self.render = render  # queue_name -> текст табло
+        self.delay = delay
+        self.min_interval = min_interval
+        self.stats = {"touches": 0, "edits": 0, "skipped": 0}
+        self._digests = {}  # queue_name -> хэш последнего отправленного текста
+        self._last_edit = {}  # queue_name -> время последней правки
+        self._dirty = set()
+        self._tasks = {}
+
+    async def post(self, queue_name, chat_id):
+        # Новое табло заменяет прежнее: старое сообщение просто перестаёт обновляться
+        text = self._text(queue_name)
+        message = await self.bot.send_message(chat_id=chat_id, text=text)
+        self.store.update_queue_info(
+            queue_name, board={"chat_id": chat_id, "message_id": message.message_id}
+        )
+        self._digests[queue_name] = _digest(text)
+        self._last_edit[queue_name] = time.monotonic()
+        return message
+
+    def touch(self, queue_name):
+        info = self.store.get_queue(queue_name)
+        if info is None or not info.get("board"):
+            return
+        self.stats["touches"] += 1
+        self._dirty.add(queue_name)
+        task = self._tasks.get(queue_name)
+        if task is None or task.done():
+            self._tasks[queue_name] = asyncio.get_running_loop().create_task(self._run(queue_name))
+
+    async def close(self):
+        # Перед остановкой дописываем то, что ещё не попало на табло
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for queue_name in list(self._dirty):
+            self._dirty.discard(queue_name)
+            try:
+                await self._edit(queue_name)
+            except Exception as e:
+                logger.error(f"Не удалось обновить табло очереди '{queue_name}': {e}")
+
+    def _text(self, queue_name):
+        text = self.render(queue_name)
+        if len(text) > MAX_BOARD_LENGTH:
+            text = text[:MAX_BOARD_LENGTH - 1] + "…"
+        return text
+
+    async def _run(self, queue_name):
+        while queue_name in self._dirty:
+            wait = max(
+                self.delay,
+                self._last_edit.get(queue_name, 0.0) + self.min_interval - time.monotonic()
+            )
+            await asyncio.sleep(wait)
+            self._dirty.discard(queue_name)
+            try:
+                await self._edit(queue_name)
+            except Exception as e:
+                logger.error(f"Не удалось обновить табло очереди '{queue_name}': {e}")
+
+    async def _edit(self, queue_name):
+        info = self.store.get_queue(queue_name)
+        board = info.get("board") if info else None
+        if not board:
+            return
+        text = self._text(queue_name)
+        digest = _digest(text)
+        if self._digests.get(queue_name) == digest:
+            self.stats["skipped"] += 1
+            return
+
+        while True:
+            try:
+                await self.bot.edit_message_text(
+                    text, chat_id=board["chat_id"], message_id=board["message_id"]
+                )
+                break
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                await asyncio.sleep(retry_after)
+            except Forbidden as e:
+                self._drop(queue_name, e)
+                return
+            except BadRequest as e:
+                if "message is not modified" in e.message.lower():
+                    break
+                if any(reason in e.message.lower() for reason in GONE_ERRORS):
+                    self._drop(queue_name, e)
+                    return
+                raise
+            except NetworkError:
+                # Табло перерисовывается целиком, так что просто повторим позже
+                self._dirty.add(queue_name)
+                raise
+
+        self._digests[queue_name] = digest
+        self._last_edit[queue_name] = time.monotonic()
+        self.stats["edits"] += 1
+
+    def _drop(self, queue_name, error):
+        logger.info(f"Табло очереди '{queue_name}' больше недоступно ({error}), отключено")
+        self.store.update_queue_info(queue_name, board=None)
+        self._digests.pop(queue_name, None)
@@ -0,0 +1,158 @@
+"""Метрики в текстовом формате Prometheus без внешних зависимостей.
+
+Метрики объявляются на уровне модулей и пока сбор не включён (enable()),
+inc/observe сразу возвращаются. Значения, которые и так где-то считаются
+(размеры очередей, число таймеров), снимаются функциями-сборщиками только
+в момент запроса /metrics.
+"""
+import asyncio
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+_enabled = False
+_metrics = []
+_collectors = []  # (имя, описание, тип, функция -> {значения меток: число} или число, имена меток)
+
+
+def enabled():
+    return _enabled
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _metrics.append(self)
+
+    def inc(self, *labelvalues, amount=1):
+        if not _enabled:
+            return
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labelvalues, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._series = {}  # значения меток -> [счётчики по корзинам..., сумма, количество]
+        _metrics.append(self)
+
+    def observe(self, value, *labelvalues):
+        if not _enabled:
+            return
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labelvalues, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum{labels} {_format_value(series[-2])}"
+            yield f"{self.name}_count{labels} {series[-1]}"
+
+
+def collector(name, help_text, kind, collect, labelnames=()):
+    # collect() вызывается только при запросе /metrics
+    _collectors.append((name, help_text, kind, collect, tuple(labelnames)))
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for name, help_text, kind, collect, labelnames in _collectors:
+        try:
+            values = collect()
+        except Exception as e:
+            logger.error(f"Ошибка сборщика метрики {name}: {e}")
+            continue
+        if not isinstance(values, dict):
+            values = {(): values}
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labelvalues, value in values.items():
+            if not isinstance(labelvalues, tuple):
+                labelvalues = (labelvalues,)
+            lines.append(f"{name}{_format_labels(labelnames, labelvalues)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+async def _handle(reader, writer):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5)
+        while (await asyncio.wait_for(reader.readline(), 5)).strip():
+            pass  # Заголовки не нужны
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, content_type = "200 OK", "text/plain; version=0.0.4; charset=utf-8"
+            body = render().encode("utf-8")
+        else:
+            status, content_type, body = "404 Not Found", "text/plain; charset=utf-8", b"not found"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host, port):
+    """Поднимает /metrics на отдельном порту; возвращает asyncio.Server (закрыть через close())."""
+    server = await asyncio.start_server(_handle, host, port)
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,108 @@
+from collections import OrderedDict
+
+CACHE_SIZE = 256  # Очередей с готовым составом на тенант
+
+
+class _Listing:
+    __slots__ = ("version", "names", "lines", "_text")
+
+    def __init__(self, version, members):
+        self.version = version
+        self.names = [m["username"] for m in members]
+        self.lines = [f"{m['position']}. {m['username']}" for m in members]
+        self._text = None
+
+    @property
+    def count(self):
+        return len(self.names)
+
+    @property
+    def text(self):
+        # Строки склеиваются только при показе, а не на каждое изменение
+        if self._text is None:
+            self._text = "\n".join(self.lines)
+        return self._text
+
+    def renumber(self, start):
+        # Позиции плотные: после выхода с позиции start сдвигаются только строки за ней
+        self.lines[start - 1:] = [
+            f"{position}. {name}" for position, name in enumerate(self.names[start - 1:], start)
+        ]
+        self._text = None
+
+
+class QueueListings:
+    """Отрисованные составы очередей ("1. имя" по строке) для карточки и табло.
+
+    Состав хранится вместе с версией очереди, которой он соответствует.
+    Изменения, сделанные этим процессом, правят готовые строки на месте:
+    вступление дописывает строку, выход перенумеровывает хвост, обмен
+    меняет две строки. Правка принимается, только если версия очереди
+    выросла ровно на одно изменение; иначе (изменения другого процесса,
+    повтор операции) состав перечитывается целиком при следующем показе.
+    """
+
+    def __init__(self, store, max_entries=CACHE_SIZE):
+        self.store = store
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "rebuilds": 0, "edits": 0}
+        self._entries = OrderedDict()
+
+    def get(self, queue_name):
+        version = self.store.version(queue_name)
+        listing = self._entries.get(queue_name)
+        if listing is not None and listing.version == version:
+            self._entries.move_to_end(queue_name)
+            self.stats["hits"] += 1
+            return listing
+        self.stats["rebuilds"] += 1
+        listing = self._entries[queue_name] = _Listing(version, self.store.members(queue_name))
+        self._entries.move_to_end(queue_name)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return listing
+
+    def appended(self, queue_name, members):
+        # members — [(позиция, имя)] вступивших одним изменением, по возрастанию позиций
+        def edit(listing):
+            if not members or members[0][0] != listing.count + 1:
+                return False
+            for position, username in members:
+                listing.names.append(username)
+                listing.lines.append(f"{position}. {username}")
+            listing._text = None
+            return True
+        self._changed(queue_name, edit)
+
+    def removed(self, queue_name, position):
+        def edit(listing):
+            if not 1 <= position <= listing.count:
+                return False
+            del listing.names[position - 1]
+            listing.renumber(position)
+            return True
+        self._changed(queue_name, edit)
+
+    def swapped(self, queue_name, first_position, second_position):
+        def edit(listing):
+            if max(first_position, second_position) > listing.count:
+                return False
+            names = listing.names
+            first, second = first_position - 1, second_position - 1
+            names[first], names[second] = names[second], names[first]
+            for index in (first, second):
+                listing.lines[index] = f"{index + 1}. {names[index]}"
+            listing._text = None
+            return True
+        self._changed(queue_name, edit)
+
+    def _changed(self, queue_name, edit):
+        listing = self._entries.get(queue_name)
+        if listing is None:
+            return
+        version = self.store.version(queue_name)
+        if version == listing.version + 1 and edit(listing):
+            listing.version = version
+            self.stats["edits"] += 1
+        else:
+            del self._entries[queue_name]
@@ -0,0 +1,106 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TimerScheduler:
+    """Все отложенные события в одной куче и одной задаче asyncio.
+
+    Время срабатывания — unix timestamp, чтобы его можно было сохранить
+    и восстановить после перезапуска. Отмена ленивая: запись остаётся в
+    куче и пропускается, когда до неё доходит очередь.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._timers = {}  # key -> актуальная запись в куче
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._running = set()
+        self._firing = {}  # key -> задача сработавшего события, пока она выполняется
+
+    def __len__(self):
+        return len(self._timers)
+
+    def __contains__(self, key):
+        return key in self._timers
+
+    def is_firing(self, key):
+        # Событие уже сработало, но его обработчик ещё не закончил
+        return key in self._firing
+
+    def due_time(self, key):
+        entry = self._timers.get(key)
+        return entry[0] if entry else None
+
+    def schedule(self, key, due, callback):
+        entry = [due, next(self._counter), key, callback]
+        self._timers[key] = entry
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    def reschedule(self, key, due):
+        entry = self._timers.get(key)
+        if entry is None:
+            return False
+        self.schedule(key, due, entry[3])
+        return True
+
+    def cancel(self, key):
+        return self._timers.pop(key, None) is not None
+
+    def clear(self):
+        # Уже сработавшие события дорабатывают; записи в куче отсеются лениво
+        self._timers.clear()
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        tasks = list(self._running)
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _is_current(self, entry):
+        return self._timers.get(entry[2]) is entry
+
+    async def _run(self):
+        while True:
+            while self._heap and not self._is_current(self._heap[0]):
+                heapq.heappop(self._heap)
+
+            self._wakeup.clear()
+            timeout = None
+            if self._heap:
+                timeout = self._heap[0][0] - time.time()
+                if timeout <= 0:
+                    self._fire(heapq.heappop(self._heap))
+                    continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _fire(self, entry):
+        due, _, key, callback = entry
+        del self._timers[key]
+        task = asyncio.get_running_loop().create_task(self._call(key, callback))
+        self._running.add(task)
+        self._firing[key] = task
+        task.add_done_callback(self._running.discard)
+        task.add_done_callback(lambda task: self._firing.pop(key) if self._firing.get(key) is task else None)
+
+    async def _call(self, key, callback):
+        try:
+            await callback(key)
+        except Exception as e:
+            logger.error(f"Ошибка при выполнении отложенного события {key}: {e}")
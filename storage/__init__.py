@@ -0,0 +1,22 @@
+from .base import BaseStorage, StorageError
+from .json_backend import JsonStorage
+from .sqlite_backend import SqliteStorage
+
+BACKENDS = {
+    "json": JsonStorage,
+    "sqlite": SqliteStorage,
+}
+
+
+def open_storage(backend, path, main_admin_id):
+    try:
+        storage_class = BACKENDS[backend]
+    except KeyError:
+        raise StorageError(f"Неизвестное хранилище: {backend}") from None
+    return storage_class(path, main_admin_id)
+
+
+__all__ = [
+    "BaseStorage", "StorageError", "JsonStorage", "SqliteStorage",
+    "BACKENDS", "open_storage",
+]
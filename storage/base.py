@@ -0,0 +1,167 @@
+import metrics
+
+STORAGE_SECONDS = metrics.Histogram(
+    "queuebot_storage_seconds", "Длительность операций хранилища", ("backend", "op")
+)
+STORAGE_BYTES = metrics.Counter(
+    "queuebot_storage_bytes_total", "Байт прочитано и записано хранилищем", ("backend", "op")
+)
+
+REGISTRY_RELOAD_INTERVAL = 10  # Как часто проверять, не изменили ли админов и пользователей извне
+OPERATION_TTL = 24 * 3600  # Сколько помнить выполненные операции с op_id
+
+
+class StorageError(Exception):
+    pass
+
+
+class BaseStorage:
+    """Общий интерфейс хранилища очередей, которым пользуется QueueBot.
+
+    Изменения участников принимают op_id: повтор операции с тем же op_id
+    (то же нажатие, доставленное ещё раз) возвращает прежний результат
+    и ничего не меняет.
+    """
+
+    def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def flush(self):
+        pass
+
+    # --- Чтение ---
+
+    def is_admin(self, user_id):
+        raise NotImplementedError
+
+    def all_users(self):
+        raise NotImplementedError
+
+    def subscribers(self):
+        raise NotImplementedError
+
+    def get_queue(self, queue_name):
+        raise NotImplementedError
+
+    def queue_name(self, queue_id):
+        raise NotImplementedError
+
+    def active_queues(self):
+        raise NotImplementedError
+
+    def version(self, queue_name=None):
+        # Счётчик изменений очереди (или всех очередей при queue_name=None)
+        raise NotImplementedError
+
+    def members(self, queue_name, offset=0, limit=None):
+        raise NotImplementedError
+
+    def pending_openings(self):
+        raise NotImplementedError
+
+    def closed_queues(self):
+        # Закрытые очереди, ещё не перенесённые в архив: {имя: closed_at или None}
+        raise NotImplementedError
+
+    def member_count(self, queue_name):
+        raise NotImplementedError
+
+    def is_member(self, queue_name, user_id):
+        raise NotImplementedError
+
+    def position(self, queue_name, user_id):
+        raise NotImplementedError
+
+    def user_queues(self, user_id, active_only=False):
+        raise NotImplementedError
+
+    def waitlist(self, queue_name):
+        raise NotImplementedError
+
+    def waitlist_count(self, queue_name):
+        raise NotImplementedError
+
+    def waitlist_position(self, queue_name, user_id):
+        raise NotImplementedError
+
+    def waitlisted_queues(self, user_id):
+        raise NotImplementedError
+
+    # --- Изменения ---
+
+    def register_user(self, user_id):
+        raise NotImplementedError
+
+    def block_user(self, user_id):
+        raise NotImplementedError
+
+    def create_queue(self, queue_name, info):
+        raise NotImplementedError
+
+    def open_queue(self, queue_name, opened_at):
+        # False, если очередь уже открывали или закрыли: открыть её может только один вызов
+        raise NotImplementedError
+
+    def close_queue(self, queue_name, closed_at):
+        # False, если очередь уже закрыта
+        raise NotImplementedError
+
+    def update_queue_info(self, queue_name, **changes):
+        # Дополнительные поля описания очереди; None удаляет поле
+        raise NotImplementedError
+
+    def pop_queue_flag(self, queue_name, flag):
+        # Снимает флаг из описания очереди; True получает только тот, кто снял его первым
+        raise NotImplementedError
+
+    def drop_queue(self, queue_name):
+        # Убирает очередь из рабочего состояния и возвращает её {"name", "info", "members"}
+        raise NotImplementedError
+
+    def add_member(self, queue_name, user_id, username):
+        raise NotImplementedError
+
+    def add_members(self, queue_name, members, max_size=None, op_ids=None):
+        # Позиции по порядку members: None — уже в очереди; с max_size False — не принят,
+        # потому что очередь закрыта или заполнена. op_ids — по одному на участника
+        raise NotImplementedError
+
+    def remove_member(self, queue_name, user_id, op_id=None):
+        raise NotImplementedError
+
+    def advance_queue(self, queue_name, op_id=None):
+        # Убирает первого участника и возвращает его {"user_id", "username"}; None — очередь пуста
+        raise NotImplementedError
+
+    # --- Лист ожидания переполненной очереди ---
+
+    def add_waitlisted(self, queue_name, members, max_size=None):
+        # Места в листе по порядку members: None — уже в очереди, False — лист заполнен;
+        # кто уже ждёт, получает своё прежнее место
+        raise NotImplementedError
+
+    def remove_waitlisted(self, queue_name, user_id):
+        raise NotImplementedError
+
+    def promote_waitlisted(self, queue_name, max_size):
+        # Переводит первых из листа на свободные места: [{"user_id", "username", "position"}]
+        raise NotImplementedError
+
+    def clear_waitlist(self, queue_name):
+        # Очищает лист и возвращает user_id тех, кто ждал
+        raise NotImplementedError
+
+    def swap_members(self, queue_name, first_user_id, second_user_id, op_id=None):
+        raise NotImplementedError
+
+    # --- Аренда ролей между процессами ---
+
+    def acquire_lease(self, name, holder, ttl):
+        # Хранилище одного процесса: роль всегда у него
+        return True
+
+    def release_lease(self, name, holder):
+        pass
@@ -0,0 +1,672 @@
+import asyncio
+import logging
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировку файла пропускаем
+    fcntl = None
+
+import tracing
+from .base import OPERATION_TTL, REGISTRY_RELOAD_INTERVAL, STORAGE_BYTES, STORAGE_SECONDS, BaseStorage, StorageError
+from .member_queue import MemberQueue
+from .writer import DECODE_ERRORS, StorageWriter, dumps, loads
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SYNC_DELAY = 0.05  # Окно группировки записей перед fsync журнала
+COMPACT_INTERVAL = 300  # Как часто сворачивать журнал в снимок (секунды)
+COMPACT_MAX_RECORDS = 5000  # Свернуть раньше, если журнал разросся
+
+
+class JsonStorage(BaseStorage):
+    def __init__(self, path, main_admin_id,
+                 sync_delay=JOURNAL_SYNC_DELAY,
+                 compact_interval=COMPACT_INTERVAL,
+                 compact_max_records=COMPACT_MAX_RECORDS,
+                 reload_interval=REGISTRY_RELOAD_INTERVAL):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.main_admin_id = main_admin_id
+        self.sync_delay = sync_delay
+        self.compact_interval = compact_interval
+        self.compact_max_records = compact_max_records
+        self.reload_interval = reload_interval
+
+        self._pending = []  # Записи, ещё не сброшенные в журнал
+        self._journal_records = 0
+        self._sync_task = None
+        self._compact_task = None
+        self._reload_task = None
+        self._snapshot_mtime = None  # mtime последнего снимка, который записали или прочитали мы
+        self._lock_file = self._acquire_process_lock()
+        self._writer = StorageWriter()  # Журнал и снимки пишутся в отдельном потоке
+
+        self.data = self._load_snapshot()
+        # Реестры пользователей — множества; all_users — dict ради порядка регистрации
+        self._admins = set(map(str, self.data.pop("admins")))
+        self._users = dict.fromkeys(self.data.pop("all_users"))
+        self._blocked = set(self.data.pop("blocked_users"))
+        # Выполненные операции с op_id -> [результат, время]; в порядке выполнения
+        self._operations = dict(self.data.pop("operations"))
+        # Участники держатся в индексированных очередях, в снимке — списком
+        self._members = {
+            name: MemberQueue.from_list(users)
+            for name, users in self.data.pop("queue_users").items()
+        }
+        # Листы ожидания переполненных очередей — те же индексированные очереди
+        self._waitlists = {
+            name: MemberQueue.from_list(users)
+            for name, users in self.data.pop("queue_waitlists").items()
+        }
+        self._versions = {}  # очередь -> счётчик изменений
+        self._catalog_version = 0
+        self._user_queues = {}  # user_id -> {очередь: None} в порядке вступления
+        for name, queue in self._members.items():
+            for user_id in queue.user_ids():
+                self._user_queues.setdefault(user_id, {})[name] = None
+        # Короткие числовые id очередей для callback_data
+        self._queue_ids = {}
+        for name, info in self.data["queues"].items():
+            self._register_queue_id(name, info)
+        self._replay_journal()
+        self._journal = open(self.journal_path, 'ab')
+
+    def _empty(self):
+        return {
+            "admins": [str(self.main_admin_id)],
+            "queues": {},
+            "queue_users": {},
+            "queue_waitlists": {},
+            "all_users": [],
+            "blocked_users": [],
+            "operations": {},
+            "next_queue_id": 1,
+            "journal_seq": 0
+        }
+
+    def _acquire_process_lock(self):
+        # Состояние живёт в памяти процесса, поэтому второй процесс на тот же файл не пускаем
+        if fcntl is None:
+            return None
+        lock_file = open(self.path + ".lock", 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise StorageError(
+                f"{self.path} уже открыт другим процессом; "
+                f"для нескольких процессов используйте STORAGE_BACKEND = \"sqlite\""
+            )
+        return lock_file
+
+    # --- Восстановление ---
+
+    def _load_snapshot(self):
+        if not os.path.exists(self.path):
+            data = self._empty()
+            self._write_snapshot(dumps(data))
+            return data
+        started = time.perf_counter()
+        try:
+            stat = os.stat(self.path)
+            self._snapshot_mtime = stat.st_mtime_ns
+            with open(self.path, 'rb') as f:
+                data = loads(f.read())
+        except Exception as e:
+            # Пустое состояние здесь означало бы потерю всех админов и очередей
+            raise StorageError(f"Не удалось прочитать снимок {self.path}: {e}") from e
+        STORAGE_SECONDS.observe(time.perf_counter() - started, "json", "snapshot_read")
+        STORAGE_BYTES.inc("json", "snapshot_read", amount=stat.st_size)
+        for key, value in self._empty().items():
+            data.setdefault(key, value)
+        return data
+
+    def _replay_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        started = time.perf_counter()
+        with open(self.journal_path, 'rb') as f:
+            lines = f.readlines()
+        valid_size = 0
+        for number, line in enumerate(lines, 1):
+            try:
+                record = loads(line) if line.strip() else None
+            except DECODE_ERRORS:
+                if number == len(lines) and not line.endswith(b"\n"):
+                    # Оборванная последняя запись: процесс упал во время дозаписи
+                    logger.warning(f"Пропущена неполная запись журнала в строке {number}")
+                    with open(self.journal_path, 'r+b') as f:
+                        f.truncate(valid_size)
+                    break
+                raise StorageError(f"Повреждён журнал {self.journal_path}, строка {number}")
+            valid_size += len(line)
+            if record is None:
+                continue
+            self._journal_records += 1
+            # Записи до номера из снимка уже в нём учтены (сбой между снимком и очисткой журнала)
+            if record["seq"] <= self.data["journal_seq"]:
+                continue
+            self._apply(record)
+            self.data["journal_seq"] = record["seq"]
+        STORAGE_SECONDS.observe(time.perf_counter() - started, "json", "journal_replay")
+        STORAGE_BYTES.inc("json", "journal_replay", amount=valid_size)
+        logger.info(f"Журнал восстановлен: {self._journal_records} записей")
+
+    # --- Журнал и снимки ---
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._compact_task = loop.create_task(self._compact_loop())
+        self._reload_task = loop.create_task(self._reload_loop())
+
+    def _append(self, record):
+        self._pending.append(record)
+        if self._sync_task is None or self._sync_task.done():
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # Вне цикла событий (миграция, утилиты) пишем сразу
+                self._writer.run(self._write_journal, self._take_pending())
+                return
+            self._sync_task = loop.create_task(self._delayed_sync())
+
+    async def _delayed_sync(self):
+        # Пока задача жива, _append новую не запускает: записи, добавленные во время
+        # записи в потоке, дописывает эта же задача следующим заходом
+        while True:
+            await asyncio.sleep(self.sync_delay)
+            await self._sync_journal()
+            if not self._pending:
+                break
+        if self._journal_records >= self.compact_max_records:
+            await self.compact()
+
+    def _take_pending(self):
+        # Сериализуем в цикле событий, пишем в потоке: поток не трогает живое состояние
+        records, self._pending = self._pending, []
+        self._journal_records += len(records)
+        return b"".join(dumps(r) + b"\n" for r in records)
+
+    async def _sync_journal(self):
+        if not self._pending:
+            await self._writer.drain()  # Запись, начатая раньше, тоже должна дойти до диска
+            return
+        future = await self._writer.submit(self._write_journal, self._take_pending())
+        await future
+
+    def _write_journal(self, payload):
+        # Поток записи
+        started = time.perf_counter()
+        self._journal.write(payload)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        STORAGE_SECONDS.observe(time.perf_counter() - started, "json", "journal_write")
+        STORAGE_BYTES.inc("json", "journal_write", amount=len(payload))
+
+    def _write_snapshot(self, payload):
+        started = time.perf_counter()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        stat = os.stat(self.path)
+        self._snapshot_mtime = stat.st_mtime_ns
+        STORAGE_SECONDS.observe(time.perf_counter() - started, "json", "snapshot_write")
+        STORAGE_BYTES.inc("json", "snapshot_write", amount=stat.st_size)
+
+    def _replace_snapshot(self, payload):
+        # Поток записи. Снимок и очистка журнала — одно задание: записи, поставленные
+        # в очередь после него, попадут уже в новый журнал
+        self._write_snapshot(payload)
+        self._journal.truncate(0)
+        self._journal.seek(0)
+
+    async def compact(self):
+        # Сначала подхватываем ручную правку админов, иначе снимок её перезапишет
+        self.reload_admins()
+        self._prune_operations()
+        if self._pending:
+            await self._writer.submit(self._write_journal, self._take_pending())
+        if self._journal_records == 0:
+            return
+        started = time.perf_counter()
+        payload = dumps(self.export_data())
+        STORAGE_SECONDS.observe(time.perf_counter() - started, "json", "snapshot_serialize")
+        # Снимок покроет все записи журнала, поставленные до него
+        self._journal_records = 0
+        future = await self._writer.submit(self._replace_snapshot, payload)
+        try:
+            await future
+        except Exception as e:
+            logger.error(f"Ошибка сохранения снимка: {e}")
+
+    def export_data(self):
+        data = dict(self.data)
+        data["admins"] = sorted(self._admins)
+        data["all_users"] = list(self._users)
+        data["blocked_users"] = sorted(self._blocked)
+        data["queue_users"] = {name: queue.to_list() for name, queue in self._members.items()}
+        data["queue_waitlists"] = {
+            name: queue.to_list() for name, queue in self._waitlists.items() if len(queue)
+        }
+        data["operations"] = dict(self._operations)
+        return data
+
+    async def _compact_loop(self):
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            await self.compact()
+
+    def reload_admins(self):
+        # Список админов правят прямо в файле снимка; остальное в нём — наша же копия
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._snapshot_mtime:
+                return False
+            with open(self.path, 'rb') as f:
+                admins = set(map(str, loads(f.read()).get("admins", [])))
+        except Exception as e:
+            logger.error(f"Не удалось перечитать админов из {self.path}: {e}")
+            return False
+        self._snapshot_mtime = mtime
+        if admins != self._admins:
+            logger.info(f"Список админов обновлён из файла: {len(admins)}")
+            self._admins = admins
+        return True
+
+    async def _reload_loop(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            self.reload_admins()
+
+    async def flush(self):
+        with tracing.span("storage.flush"):
+            await self._sync_journal()
+
+    async def close(self):
+        for task in (self._sync_task, self._compact_task, self._reload_task):
+            if task is not None and not task.done():
+                task.cancel()
+        await self.compact()
+        await self._writer.drain()
+        self._writer.close()
+        self._journal.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+
+    # --- Чтение ---
+
+    def is_admin(self, user_id):
+        return user_id == self.main_admin_id or str(user_id) in self._admins
+
+    def all_users(self):
+        return list(self._users)
+
+    def subscribers(self):
+        return [u for u in self._users if u not in self._blocked]
+
+    def get_queue(self, queue_name):
+        return self.data["queues"].get(queue_name)
+
+    def active_queues(self):
+        return {
+            name: info for name, info in self.data["queues"].items()
+            if info.get("is_active", False)
+        }
+
+    def queue_name(self, queue_id):
+        return self._queue_ids.get(queue_id)
+
+    def pending_openings(self):
+        return {
+            name: info["scheduled_open_time"] for name, info in self.data["queues"].items()
+            if info.get("scheduled_open_time")
+            and not info.get("is_active", False)
+            and not info.get("opened_at")
+            and not info.get("closed_at")
+        }
+
+    def closed_queues(self):
+        # Без closed_at — очереди, закрытые до появления этого поля (или не открытые по расписанию)
+        return {
+            name: info.get("closed_at") for name, info in self.data["queues"].items()
+            if not info.get("is_active", False)
+            and (info.get("closed_at") or info.get("opened_at") or not info.get("scheduled_open_time"))
+        }
+
+    def version(self, queue_name=None):
+        if queue_name is None:
+            return self._catalog_version
+        return self._versions.get(queue_name, 0)
+
+    def members(self, queue_name, offset=0, limit=None):
+        queue = self._members.get(queue_name)
+        if queue is None:
+            return []
+        return list(queue.slice(offset, limit))
+
+    def member_count(self, queue_name):
+        queue = self._members.get(queue_name)
+        return len(queue) if queue is not None else 0
+
+    def is_member(self, queue_name, user_id):
+        queue = self._members.get(queue_name)
+        return queue is not None and str(user_id) in queue
+
+    def position(self, queue_name, user_id):
+        queue = self._members.get(queue_name)
+        return queue.position(str(user_id)) if queue is not None else None
+
+    def waitlist(self, queue_name):
+        queue = self._waitlists.get(queue_name)
+        return queue.to_list() if queue is not None else []
+
+    def waitlist_count(self, queue_name):
+        queue = self._waitlists.get(queue_name)
+        return len(queue) if queue is not None else 0
+
+    def waitlist_position(self, queue_name, user_id):
+        queue = self._waitlists.get(queue_name)
+        return queue.position(str(user_id)) if queue is not None else None
+
+    def waitlisted_queues(self, user_id):
+        # Листов ожидания немного (по одному на переполненную очередь), обход дешёвый
+        return [name for name, queue in self._waitlists.items() if str(user_id) in queue]
+
+    def user_queues(self, user_id, active_only=False):
+        names = self._user_queues.get(str(user_id), {})
+        return [
+            name for name in names
+            if not active_only or self.data["queues"].get(name, {}).get("is_active", False)
+        ]
+
+    # --- Изменения ---
+
+    def _commit(self, record):
+        op_id = record.pop("op_id", None)
+        if op_id is not None:
+            record["op_id"] = op_id
+            if op_id in self._operations:
+                return self._operations[op_id][0]  # Повтор: отдаём прежний результат, ничего не меняя
+            record["op_at"] = time.time()
+        with tracing.span("storage." + record["op"]):
+            result = self._apply(record)
+            if result is not None and result is not False:
+                self.data["journal_seq"] += 1
+                record["seq"] = self.data["journal_seq"]
+                self._append(record)
+        return result
+
+    def _apply(self, record):
+        handler = getattr(self, f"_apply_{record['op']}", None)
+        if handler is None:
+            raise StorageError(f"Неизвестная операция журнала: {record['op']}")
+        result = handler(record)
+        if record.get("op_id") is not None:
+            self._operations[record["op_id"]] = [result, record["op_at"]]
+        if "queue" in record and result is not None and result is not False:
+            self._versions[record["queue"]] = self._versions.get(record["queue"], 0) + 1
+            self._catalog_version += 1
+        return result
+
+    def register_user(self, user_id):
+        return self._commit({"op": "register", "user": str(user_id)})
+
+    def block_user(self, user_id):
+        return self._commit({"op": "block", "user": str(user_id)})
+
+    def create_queue(self, queue_name, info):
+        if queue_name in self.data["queues"]:
+            return False
+        info = dict(info, id=self.data["next_queue_id"])
+        return self._commit({"op": "create", "queue": queue_name, "info": info})
+
+    def open_queue(self, queue_name, opened_at):
+        return self._commit({"op": "open", "queue": queue_name, "at": opened_at})
+
+    def close_queue(self, queue_name, closed_at):
+        return self._commit({"op": "close", "queue": queue_name, "at": closed_at})
+
+    def update_queue_info(self, queue_name, **changes):
+        return self._commit({"op": "update", "queue": queue_name, "changes": changes})
+
+    def pop_queue_flag(self, queue_name, flag):
+        return self._commit({"op": "pop_flag", "queue": queue_name, "flag": flag})
+
+    def drop_queue(self, queue_name):
+        return self._commit({"op": "drop", "queue": queue_name})
+
+    def add_member(self, queue_name, user_id, username):
+        return self._commit({
+            "op": "join", "queue": queue_name, "user": str(user_id), "name": username
+        })
+
+    def add_members(self, queue_name, members, max_size=None, op_ids=None):
+        # Вся пачка уходит в журнал одной записью
+        return self._commit({
+            "op": "join_many", "queue": queue_name, "max": max_size,
+            "users": [[str(user_id), username] for user_id, username in members],
+            "ops": op_ids, "op_at": time.time()
+        })
+
+    def add_waitlisted(self, queue_name, members, max_size=None):
+        return self._commit({
+            "op": "wait", "queue": queue_name, "max": max_size,
+            "users": [[str(user_id), username] for user_id, username in members]
+        })
+
+    def remove_waitlisted(self, queue_name, user_id):
+        return self._commit({"op": "unwait", "queue": queue_name, "user": str(user_id)})
+
+    def promote_waitlisted(self, queue_name, max_size):
+        return self._commit({"op": "promote", "queue": queue_name, "max": max_size}) or []
+
+    def clear_waitlist(self, queue_name):
+        return self._commit({"op": "clear_wait", "queue": queue_name}) or []
+
+    def remove_member(self, queue_name, user_id, op_id=None):
+        return self._commit({
+            "op": "remove", "queue": queue_name, "user": str(user_id), "op_id": op_id
+        })
+
+    def advance_queue(self, queue_name, op_id=None):
+        return self._commit({"op": "advance", "queue": queue_name, "op_id": op_id})
+
+    def swap_members(self, queue_name, first_user_id, second_user_id, op_id=None):
+        return self._commit({
+            "op": "swap", "queue": queue_name,
+            "first": str(first_user_id), "second": str(second_user_id), "op_id": op_id
+        })
+
+    def _prune_operations(self):
+        expired = time.time() - OPERATION_TTL
+        while self._operations:
+            op_id = next(iter(self._operations))
+            if self._operations[op_id][1] > expired:
+                break
+            del self._operations[op_id]
+
+    def _apply_register(self, record):
+        # Повторный /start снова подписывает пользователя на уведомления
+        if record["user"] in self._blocked:
+            self._blocked.discard(record["user"])
+            return True
+        if record["user"] in self._users:
+            return False
+        self._users[record["user"]] = None
+        return True
+
+    def _apply_block(self, record):
+        if record["user"] in self._blocked:
+            return False
+        self._blocked.add(record["user"])
+        return True
+
+    def _register_queue_id(self, queue_name, info):
+        if "id" not in info:
+            info["id"] = self.data["next_queue_id"]
+        self.data["next_queue_id"] = max(self.data["next_queue_id"], info["id"] + 1)
+        self._queue_ids[info["id"]] = queue_name
+
+    def _apply_create(self, record):
+        if record["queue"] in self.data["queues"]:
+            return False
+        queue_info = self.data["queues"][record["queue"]] = dict(record["info"])
+        self._register_queue_id(record["queue"], queue_info)
+        return True
+
+    def _apply_open(self, record):
+        queue_info = self.data["queues"].get(record["queue"])
+        if queue_info is None or queue_info.get("is_active") \
+                or queue_info.get("opened_at") or queue_info.get("closed_at"):
+            return False
+        queue_info["is_active"] = True
+        queue_info["opened_at"] = record["at"]
+        return True
+
+    def _apply_close(self, record):
+        queue_info = self.data["queues"].get(record["queue"])
+        if queue_info is None or queue_info.get("closed_at"):
+            return False
+        queue_info["is_active"] = False
+        queue_info["closed_at"] = record.get("at")
+        return True
+
+    def _apply_update(self, record):
+        queue_info = self.data["queues"].get(record["queue"])
+        if queue_info is None:
+            return False
+        for key, value in record["changes"].items():
+            if value is None:
+                queue_info.pop(key, None)
+            else:
+                queue_info[key] = value
+        return True
+
+    def _apply_pop_flag(self, record):
+        queue_info = self.data["queues"].get(record["queue"])
+        if queue_info is None or not queue_info.get(record["flag"]):
+            return False
+        del queue_info[record["flag"]]
+        return True
+
+    def _apply_drop(self, record):
+        queue_info = self.data["queues"].pop(record["queue"], None)
+        if queue_info is None:
+            return None
+        self._queue_ids.pop(queue_info.get("id"), None)
+        self._waitlists.pop(record["queue"], None)
+        queue = self._members.pop(record["queue"], None)
+        members = queue.to_list() if queue is not None else []
+        for member in members:
+            names = self._user_queues[member["user_id"]]
+            del names[record["queue"]]
+            if not names:
+                del self._user_queues[member["user_id"]]
+        # Счётчик версии не сбрасываем: очередь с тем же именем не должна попасть в старый кэш
+        return {"name": record["queue"], "info": queue_info, "members": members}
+
+    def _apply_join(self, record):
+        queue = self._members.get(record["queue"])
+        if queue is None:
+            queue = self._members[record["queue"]] = MemberQueue()
+        position = queue.append(record["user"], record["name"])
+        if position is not None:
+            self._user_queues.setdefault(record["user"], {})[record["queue"]] = None
+        return position
+
+    def _apply_join_many(self, record):
+        max_size = record.get("max")
+        if max_size is not None:
+            queue_info = self.data["queues"].get(record["queue"])
+            if queue_info is None or not queue_info.get("is_active", False):
+                return [False] * len(record["users"])
+        positions = []
+        for i, (user_id, username) in enumerate(record["users"]):
+            op_id = record["ops"][i] if record.get("ops") else None
+            if op_id is not None and op_id in self._operations:
+                positions.append(self._operations[op_id][0])
+                continue
+            positions.append(self._join_one(record, user_id, username, max_size))
+            if op_id is not None:
+                self._operations[op_id] = [positions[-1], record["op_at"]]
+        return positions
+
+    def _join_one(self, record, user_id, username, max_size):
+        queue = self._members.get(record["queue"])
+        if max_size is not None and queue is not None and len(queue) >= max_size:
+            return None if user_id in queue else False
+        return self._apply_join({"queue": record["queue"], "user": user_id, "name": username})
+
+    def _apply_wait(self, record):
+        members = self._members.get(record["queue"])
+        queue = self._waitlists.get(record["queue"])
+        if queue is None:
+            queue = self._waitlists[record["queue"]] = MemberQueue()
+        positions = []
+        for user_id, username in record["users"]:
+            if members is not None and user_id in members:
+                positions.append(None)
+            elif user_id in queue:
+                positions.append(queue.position(user_id))  # Уже ждёт: место не меняется
+            elif record.get("max") is not None and len(queue) >= record["max"]:
+                positions.append(False)
+            else:
+                positions.append(queue.append(user_id, username))
+        return positions
+
+    def _apply_unwait(self, record):
+        queue = self._waitlists.get(record["queue"])
+        return queue.remove(record["user"]) if queue is not None else None
+
+    def _apply_promote(self, record):
+        # Первые из листа ожидания занимают свободные места; None — никого не перевели
+        queue = self._waitlists.get(record["queue"])
+        if not queue or not self.data["queues"].get(record["queue"], {}).get("is_active", False):
+            return None
+        promoted = []
+        while len(queue) and self.member_count(record["queue"]) < record["max"]:
+            user_id = queue.at(1)
+            username = queue.username(user_id)
+            queue.remove(user_id)
+            position = self._apply_join({"queue": record["queue"], "user": user_id, "name": username})
+            if position is not None:
+                promoted.append({"user_id": user_id, "username": username, "position": position})
+        return promoted or None
+
+    def _apply_clear_wait(self, record):
+        queue = self._waitlists.pop(record["queue"], None)
+        if not queue:
+            return None
+        return list(queue.user_ids())
+
+    def _apply_remove(self, record):
+        queue = self._members.get(record["queue"])
+        if queue is None:
+            return None
+        removed_position = queue.remove(record["user"])
+        if removed_position is not None:
+            names = self._user_queues[record["user"]]
+            del names[record["queue"]]
+            if not names:
+                del self._user_queues[record["user"]]
+        return removed_position
+
+    def _apply_advance(self, record):
+        queue = self._members.get(record["queue"])
+        if not queue:
+            return None
+        user_id = queue.at(1)
+        username = queue.username(user_id)
+        self._apply_remove({"queue": record["queue"], "user": user_id})
+        return {"user_id": user_id, "username": username}
+
+    def _apply_swap(self, record):
+        queue = self._members.get(record["queue"])
+        if queue is None:
+            return None
+        return queue.swap(record["first"], record["second"])
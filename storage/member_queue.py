@@ -0,0 +1,163 @@
+class FenwickTree:
+    def __init__(self, size):
+        self.size = size
+        self._tree = [0] * (size + 1)
+        self._top = 1 << max(size.bit_length() - 1, 0)
+
+    @classmethod
+    def from_flags(cls, flags, size):
+        tree = cls(size)
+        data = tree._tree
+        for i, flag in enumerate(flags, 1):
+            data[i] = flag
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                data[parent] += data[i]
+        return tree
+
+    def add(self, index, delta):
+        i = index + 1
+        while i <= self.size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix(self, index):
+        # Сумма флагов на позициях 0..index включительно
+        total = 0
+        i = index + 1
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, k):
+        # Индекс k-го (с единицы) занятого слота
+        pos = 0
+        step = self._top
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self._tree[nxt] < k:
+                pos = nxt
+                k -= self._tree[nxt]
+            step >>= 1
+        return pos
+
+
+class MemberQueue:
+    """Очередь участников с O(1) проверкой членства и O(log n) позициями.
+
+    Каждый участник занимает слот в порядке прихода; дерево Фенвика над
+    занятыми слотами даёт позицию (ранг) и поиск участника по позиции.
+    Выход из очереди освобождает слот без сдвига остальных, обмен меняет
+    слоты местами. Когда пустых слотов становится больше, чем занятых,
+    массив уплотняется.
+    """
+
+    MIN_CAPACITY = 32
+
+    def __init__(self):
+        self._slots = []  # user_id или None
+        self._index = {}  # user_id -> номер слота
+        self._names = {}  # user_id -> username
+        self._tree = FenwickTree(self.MIN_CAPACITY)
+
+    @classmethod
+    def from_list(cls, members):
+        queue = cls()
+        for m in sorted(members, key=lambda m: m["position"]):
+            if m["user_id"] not in queue._index:
+                queue._slots.append(m["user_id"])
+                queue._index[m["user_id"]] = len(queue._slots) - 1
+                queue._names[m["user_id"]] = m.get("username")
+        queue._rebuild(len(queue._slots))
+        return queue
+
+    def to_list(self):
+        return list(self)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, user_id):
+        return user_id in self._index
+
+    def __iter__(self):
+        position = 0
+        for user_id in self._slots:
+            if user_id is not None:
+                position += 1
+                yield {"user_id": user_id, "username": self._names[user_id], "position": position}
+
+    def user_ids(self):
+        return self._index.keys()
+
+    def slice(self, offset=0, limit=None):
+        # Участники с позиции offset + 1, без обхода тех, что стоят раньше
+        if offset >= len(self) or limit == 0:
+            return
+        position = offset
+        start = self._tree.find(offset + 1)
+        for user_id in self._slots[start:]:
+            if user_id is None:
+                continue
+            position += 1
+            yield {"user_id": user_id, "username": self._names[user_id], "position": position}
+            if limit is not None and position - offset >= limit:
+                return
+
+    def username(self, user_id):
+        return self._names.get(user_id)
+
+    def position(self, user_id):
+        slot = self._index.get(user_id)
+        if slot is None:
+            return None
+        return self._tree.prefix(slot)
+
+    def at(self, position):
+        if not 1 <= position <= len(self):
+            return None
+        return self._slots[self._tree.find(position)]
+
+    def append(self, user_id, username):
+        if user_id in self._index:
+            return None
+        if len(self._slots) >= self._tree.size:
+            self._rebuild(len(self._slots) + 1)
+        slot = len(self._slots)
+        self._slots.append(user_id)
+        self._index[user_id] = slot
+        self._names[user_id] = username
+        self._tree.add(slot, 1)
+        return len(self._index)
+
+    def remove(self, user_id):
+        slot = self._index.pop(user_id, None)
+        if slot is None:
+            return None
+        position = self._tree.prefix(slot)
+        self._slots[slot] = None
+        del self._names[user_id]
+        self._tree.add(slot, -1)
+        if len(self._slots) > 2 * len(self._index) + self.MIN_CAPACITY:
+            self._rebuild(len(self._index))
+        return position
+
+    def swap(self, first_user_id, second_user_id):
+        first_slot = self._index.get(first_user_id)
+        second_slot = self._index.get(second_user_id)
+        if first_slot is None or second_slot is None:
+            return None
+        first_pos = self._tree.prefix(first_slot)
+        second_pos = self._tree.prefix(second_slot)
+        self._slots[first_slot], self._slots[second_slot] = second_user_id, first_user_id
+        self._index[first_user_id], self._index[second_user_id] = second_slot, first_slot
+        return first_pos, second_pos
+
+    def _rebuild(self, needed):
+        # Уплотняем слоты и пересобираем дерево с запасом по ёмкости: O(n) амортизированно
+        self._slots = [user_id for user_id in self._slots if user_id is not None]
+        self._index = {user_id: slot for slot, user_id in enumerate(self._slots)}
+        capacity = max(self.MIN_CAPACITY, 2 * needed)
+        self._tree = FenwickTree.from_flags([1] * len(self._slots), capacity)
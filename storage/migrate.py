@@ -0,0 +1,55 @@
+"""Одноразовый перенос queue_data.json (снимок + журнал) в SQLite.
+
+    python -m storage.migrate queue_data.json queue_data.db
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+from .json_backend import JsonStorage
+from .sqlite_backend import SqliteStorage
+
+logger = logging.getLogger(__name__)
+
+
+def migrate(json_path, sqlite_path, main_admin_id):
+    source = JsonStorage(json_path, main_admin_id)
+    target = SqliteStorage(sqlite_path, main_admin_id)
+    try:
+        data = source.export_data()
+        target.import_data(data)
+    finally:
+        asyncio.run(target.close())
+        asyncio.run(source.close())
+    return data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Перенос данных очередей из JSON в SQLite")
+    parser.add_argument("json_path")
+    parser.add_argument("sqlite_path")
+    parser.add_argument("--main-admin-id", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if not os.path.exists(args.json_path):
+        logger.error(f"Файл {args.json_path} не найден")
+        return 1
+    if os.path.exists(args.sqlite_path):
+        logger.error(f"База {args.sqlite_path} уже существует, миграция не выполнена")
+        return 1
+
+    data = migrate(args.json_path, args.sqlite_path, args.main_admin_id)
+    logger.info(
+        f"Перенесено: {len(data['queues'])} очередей, "
+        f"{sum(len(u) for u in data['queue_users'].values())} участников, "
+        f"{sum(len(u) for u in data.get('queue_waitlists', {}).values())} в листах ожидания, "
+        f"{len(data['all_users'])} пользователей"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,696 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+
+import tracing
+from .base import OPERATION_TTL, REGISTRY_RELOAD_INTERVAL, STORAGE_SECONDS, BaseStorage, StorageError
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS admins (
+    user_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS blocked_users (
+    user_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS queues (
+    name TEXT PRIMARY KEY,
+    is_active INTEGER NOT NULL DEFAULT 0,
+    info TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS queue_ids (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS queue_users (
+    queue TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    username TEXT,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (queue, user_id)
+);
+CREATE TABLE IF NOT EXISTS queue_waitlist (
+    queue TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    username TEXT,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (queue, user_id)
+);
+CREATE TABLE IF NOT EXISTS versions (
+    scope TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS operations (
+    op_id TEXT PRIMARY KEY,
+    result TEXT,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_operations_at ON operations (at);
+CREATE INDEX IF NOT EXISTS idx_queue_waitlist_seq ON queue_waitlist (queue, seq);
+CREATE INDEX IF NOT EXISTS idx_queue_users_user ON queue_users (user_id);
+CREATE INDEX IF NOT EXISTS idx_queue_users_position ON queue_users (queue, position);
+CREATE INDEX IF NOT EXISTS idx_queues_active ON queues (is_active);
+"""
+
+
+class SqliteStorage(BaseStorage):
+    def __init__(self, path, main_admin_id, reload_interval=REGISTRY_RELOAD_INTERVAL):
+        self.path = path
+        self.main_admin_id = main_admin_id
+        self.reload_interval = reload_interval
+        self._reload_task = None
+        self._operations_pruned_at = 0
+        try:
+            self.conn = sqlite3.connect(path, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+            # Очереди из баз, созданных до появления числовых id
+            self.conn.execute(
+                "INSERT INTO queue_ids (name) SELECT name FROM queues "
+                "WHERE name NOT IN (SELECT name FROM queue_ids) ORDER BY rowid"
+            )
+            if main_admin_id is not None:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO admins (user_id) VALUES (?)", (str(main_admin_id),)
+                )
+            self._load_registry()
+        except sqlite3.Error as e:
+            raise StorageError(f"Не удалось открыть базу {path}: {e}") from e
+
+    def _transaction(self):
+        return _Transaction(self.conn)
+
+    def _recorded(self, op_id):
+        # (True, результат), если операцию с этим op_id уже выполняли
+        row = self.conn.execute(
+            "SELECT result FROM operations WHERE op_id = ?", (op_id,)
+        ).fetchone()
+        return (True, json.loads(row[0])) if row else (False, None)
+
+    def _record(self, op_id, result):
+        # Вызывается в транзакции самой операции: результат и изменение фиксируются вместе
+        now = time.time()
+        if now - self._operations_pruned_at > 60:
+            self.conn.execute("DELETE FROM operations WHERE at < ?", (now - OPERATION_TTL,))
+            self._operations_pruned_at = now
+        self.conn.execute(
+            "INSERT INTO operations (op_id, result, at) VALUES (?, ?, ?)",
+            (op_id, json.dumps(result), now)
+        )
+
+    def _once(self, op_id, operation):
+        if op_id is None:
+            return operation()
+        with self._transaction():
+            done, result = self._recorded(op_id)
+            if done:
+                return result
+            result = operation()
+            self._record(op_id, result)
+        return result
+
+    def _load_registry(self):
+        # Админы и пользователи читаются на каждом /start, поэтому живут в памяти
+        started = time.perf_counter()
+        self._data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        self._admins = {row[0] for row in self.conn.execute("SELECT user_id FROM admins")}
+        self._users = dict.fromkeys(
+            row[0] for row in self.conn.execute("SELECT user_id FROM users ORDER BY rowid")
+        )
+        self._blocked = {row[0] for row in self.conn.execute("SELECT user_id FROM blocked_users")}
+        STORAGE_SECONDS.observe(time.perf_counter() - started, "sqlite", "registry_read")
+
+    def reload_registry(self):
+        # data_version меняется только от коммитов других соединений (sqlite3 CLI, второй процесс)
+        try:
+            if self.conn.execute("PRAGMA data_version").fetchone()[0] == self._data_version:
+                return False
+            self._load_registry()
+        except sqlite3.Error as e:
+            logger.error(f"Не удалось перечитать пользователей из {self.path}: {e}")
+            return False
+        return True
+
+    def start(self):
+        self._reload_task = asyncio.get_running_loop().create_task(self._reload_loop())
+
+    async def _reload_loop(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            self.reload_registry()
+
+    async def close(self):
+        if self._reload_task is not None:
+            self._reload_task.cancel()
+        self.conn.close()
+
+    # --- Чтение ---
+
+    def is_admin(self, user_id):
+        return user_id == self.main_admin_id or str(user_id) in self._admins
+
+    def all_users(self):
+        return list(self._users)
+
+    def subscribers(self):
+        # Перед рассылкой подтягиваем пользователей, записанных другими процессами
+        self.reload_registry()
+        return [u for u in self._users if u not in self._blocked]
+
+    def _queue_info(self, info, is_active, queue_id):
+        queue_info = json.loads(info)
+        queue_info["is_active"] = bool(is_active)
+        queue_info["id"] = queue_id
+        return queue_info
+
+    def get_queue(self, queue_name):
+        row = self.conn.execute(
+            "SELECT q.info, q.is_active, i.id FROM queues q "
+            "JOIN queue_ids i ON i.name = q.name WHERE q.name = ?", (queue_name,)
+        ).fetchone()
+        return self._queue_info(*row) if row else None
+
+    def queue_name(self, queue_id):
+        row = self.conn.execute(
+            "SELECT name FROM queue_ids WHERE id = ?", (queue_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def active_queues(self):
+        rows = self.conn.execute(
+            "SELECT q.name, q.info, q.is_active, i.id FROM queues q "
+            "JOIN queue_ids i ON i.name = q.name WHERE q.is_active = 1 ORDER BY i.id"
+        )
+        return {
+            name: self._queue_info(info, is_active, queue_id)
+            for name, info, is_active, queue_id in rows
+        }
+
+    def pending_openings(self):
+        rows = self.conn.execute(
+            "SELECT name, json_extract(info, '$.scheduled_open_time') FROM queues "
+            "WHERE is_active = 0 "
+            "AND json_extract(info, '$.scheduled_open_time') IS NOT NULL "
+            "AND json_extract(info, '$.opened_at') IS NULL "
+            "AND json_extract(info, '$.closed_at') IS NULL"
+        )
+        return dict(rows.fetchall())
+
+    def closed_queues(self):
+        rows = self.conn.execute(
+            "SELECT name, json_extract(info, '$.closed_at') FROM queues "
+            "WHERE is_active = 0 AND ("
+            "json_extract(info, '$.closed_at') IS NOT NULL "
+            "OR json_extract(info, '$.opened_at') IS NOT NULL "
+            "OR json_extract(info, '$.scheduled_open_time') IS NULL)"
+        )
+        return dict(rows.fetchall())
+
+    def version(self, queue_name=None):
+        row = self.conn.execute(
+            "SELECT version FROM versions WHERE scope = ?",
+            ("" if queue_name is None else "q:" + queue_name,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _bump_version(self, queue_name):
+        # Вызывается внутри транзакции изменения
+        self.conn.executemany(
+            "INSERT INTO versions (scope, version) VALUES (?, 1) "
+            "ON CONFLICT (scope) DO UPDATE SET version = version + 1",
+            [("q:" + queue_name,), ("",)]
+        )
+
+    def members(self, queue_name, offset=0, limit=None):
+        # Позиции плотные (1..n), поэтому страница — диапазон по индексу (queue, position)
+        rows = self.conn.execute(
+            "SELECT user_id, username, position FROM queue_users "
+            "WHERE queue = ? AND position > ? ORDER BY position LIMIT ?",
+            (queue_name, offset, -1 if limit is None else limit)
+        )
+        return [
+            {"user_id": user_id, "username": username, "position": position}
+            for user_id, username, position in rows
+        ]
+
+    def member_count(self, queue_name):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM queue_users WHERE queue = ?", (queue_name,)
+        ).fetchone()[0]
+
+    def is_member(self, queue_name, user_id):
+        row = self.conn.execute(
+            "SELECT 1 FROM queue_users WHERE queue = ? AND user_id = ?",
+            (queue_name, str(user_id))
+        ).fetchone()
+        return row is not None
+
+    def position(self, queue_name, user_id):
+        row = self.conn.execute(
+            "SELECT position FROM queue_users WHERE queue = ? AND user_id = ?",
+            (queue_name, str(user_id))
+        ).fetchone()
+        return row[0] if row else None
+
+    def waitlist(self, queue_name):
+        rows = self.conn.execute(
+            "SELECT user_id, username FROM queue_waitlist WHERE queue = ? ORDER BY seq",
+            (queue_name,)
+        )
+        return [
+            {"user_id": user_id, "username": username, "position": position}
+            for position, (user_id, username) in enumerate(rows, 1)
+        ]
+
+    def waitlist_count(self, queue_name):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM queue_waitlist WHERE queue = ?", (queue_name,)
+        ).fetchone()[0]
+
+    def waitlist_position(self, queue_name, user_id):
+        # seq растёт с каждым вставшим в лист, место — сколько стоят не позже
+        row = self.conn.execute(
+            "SELECT COUNT(*) FROM queue_waitlist w, queue_waitlist me "
+            "WHERE me.queue = ? AND me.user_id = ? AND w.queue = me.queue AND w.seq <= me.seq",
+            (queue_name, str(user_id))
+        ).fetchone()
+        return row[0] or None
+
+    def waitlisted_queues(self, user_id):
+        rows = self.conn.execute(
+            "SELECT w.queue FROM queue_waitlist w JOIN queues q ON q.name = w.queue "
+            "WHERE w.user_id = ? ORDER BY q.rowid", (str(user_id),)
+        )
+        return [row[0] for row in rows]
+
+    def user_queues(self, user_id, active_only=False):
+        sql = (
+            "SELECT qu.queue FROM queue_users qu JOIN queues q ON q.name = qu.queue "
+            "WHERE qu.user_id = ?"
+        )
+        if active_only:
+            sql += " AND q.is_active = 1"
+        return [row[0] for row in self.conn.execute(sql + " ORDER BY q.rowid", (str(user_id),))]
+
+    # --- Изменения ---
+
+    def register_user(self, user_id):
+        user_id = str(user_id)
+        if user_id in self._users and user_id not in self._blocked:
+            return False  # Обычный повторный /start: в базу не ходим
+        with self._transaction():
+            unblocked = self.conn.execute(
+                "DELETE FROM blocked_users WHERE user_id = ?", (user_id,)
+            ).rowcount
+            inserted = self.conn.execute(
+                "INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,)
+            ).rowcount
+        self._blocked.discard(user_id)
+        self._users[user_id] = None
+        return unblocked + inserted > 0
+
+    def block_user(self, user_id):
+        user_id = str(user_id)
+        if user_id in self._blocked:
+            return False
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO blocked_users (user_id) VALUES (?)", (user_id,)
+        )
+        self._blocked.add(user_id)
+        return cursor.rowcount > 0
+
+    def create_queue(self, queue_name, info):
+        info = dict(info)
+        is_active = info.pop("is_active", False)
+        queue_id = info.pop("id", None)  # Задан при переносе из JSON
+        with self._transaction():
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO queues (name, is_active, info) VALUES (?, ?, ?)",
+                (queue_name, int(is_active), json.dumps(info, ensure_ascii=False))
+            )
+            if cursor.rowcount > 0:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO queue_ids (id, name) VALUES (?, ?)",
+                    (queue_id, queue_name)
+                )
+                self._bump_version(queue_name)
+        return cursor.rowcount > 0
+
+    def _update_queue(self, queue_name, is_active, **changes):
+        with self._transaction():
+            queue_info = self.get_queue(queue_name)
+            if queue_info is None:
+                return False
+            if is_active is None:
+                is_active = queue_info["is_active"]
+            queue_info.pop("is_active")
+            queue_info.pop("id")
+            for key, value in changes.items():
+                if value is None:
+                    queue_info.pop(key, None)
+                else:
+                    queue_info[key] = value
+            self.conn.execute(
+                "UPDATE queues SET is_active = ?, info = ? WHERE name = ?",
+                (int(is_active), json.dumps(queue_info, ensure_ascii=False), queue_name)
+            )
+            self._bump_version(queue_name)
+        return True
+
+    def open_queue(self, queue_name, opened_at):
+        # Сравнение и запись в одной транзакции: из нескольких процессов очередь откроет один
+        with self._transaction():
+            queue_info = self.get_queue(queue_name)
+            if queue_info is None or queue_info["is_active"] \
+                    or queue_info.get("opened_at") or queue_info.get("closed_at"):
+                return False
+            return self._update_queue(queue_name, True, opened_at=opened_at)
+
+    def close_queue(self, queue_name, closed_at):
+        with self._transaction():
+            queue_info = self.get_queue(queue_name)
+            if queue_info is None or queue_info.get("closed_at"):
+                return False
+            return self._update_queue(queue_name, False, closed_at=closed_at)
+
+    def update_queue_info(self, queue_name, **changes):
+        return self._update_queue(queue_name, None, **changes)
+
+    def pop_queue_flag(self, queue_name, flag):
+        with self._transaction():
+            queue_info = self.get_queue(queue_name)
+            if queue_info is None or not queue_info.get(flag):
+                return False
+            return self._update_queue(queue_name, None, **{flag: None})
+
+    def drop_queue(self, queue_name):
+        with self._transaction():
+            queue_info = self.get_queue(queue_name)
+            if queue_info is None:
+                return None
+            members = self.members(queue_name)
+            self.conn.execute("DELETE FROM queue_users WHERE queue = ?", (queue_name,))
+            self.conn.execute("DELETE FROM queue_waitlist WHERE queue = ?", (queue_name,))
+            self.conn.execute("DELETE FROM queues WHERE name = ?", (queue_name,))
+            self.conn.execute("DELETE FROM queue_ids WHERE name = ?", (queue_name,))
+            # Строку версии оставляем: очередь с тем же именем не должна попасть в старый кэш
+            self._bump_version(queue_name)
+        return {"name": queue_name, "info": queue_info, "members": members}
+
+    def add_member(self, queue_name, user_id, username):
+        with self._transaction():
+            position = self.conn.execute(
+                "SELECT COALESCE(MAX(position), 0) + 1 FROM queue_users WHERE queue = ?",
+                (queue_name,)
+            ).fetchone()[0]
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO queue_users (queue, user_id, username, position) "
+                "VALUES (?, ?, ?, ?)",
+                (queue_name, str(user_id), username, position)
+            )
+            if cursor.rowcount > 0:
+                self._bump_version(queue_name)
+        return position if cursor.rowcount > 0 else None
+
+    def add_members(self, queue_name, members, max_size=None, op_ids=None):
+        with self._transaction():
+            count = None
+            if max_size is not None:
+                # Проверка активности и вместимости внутри той же транзакции, что и вставка:
+                # BEGIN IMMEDIATE не даст другому процессу вклиниться между ними
+                row = self.conn.execute(
+                    "SELECT is_active FROM queues WHERE name = ?", (queue_name,)
+                ).fetchone()
+                if row is None or not row[0]:
+                    return [False] * len(members)
+                count = self.member_count(queue_name)
+            next_position = self.conn.execute(
+                "SELECT COALESCE(MAX(position), 0) + 1 FROM queue_users WHERE queue = ?",
+                (queue_name,)
+            ).fetchone()[0]
+            positions = []
+            positions_start = next_position
+            for i, (user_id, username) in enumerate(members):
+                op_id = op_ids[i] if op_ids else None
+                if op_id is not None:
+                    done, result = self._recorded(op_id)
+                    if done:
+                        positions.append(result)
+                        continue
+                if count is not None and count >= max_size:
+                    positions.append(None if self.is_member(queue_name, user_id) else False)
+                    if op_id is not None:
+                        self._record(op_id, positions[-1])
+                    continue
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO queue_users (queue, user_id, username, position) "
+                    "VALUES (?, ?, ?, ?)",
+                    (queue_name, str(user_id), username, next_position)
+                )
+                if cursor.rowcount > 0:
+                    positions.append(next_position)
+                    next_position += 1
+                    if count is not None:
+                        count += 1
+                else:
+                    positions.append(None)
+                if op_id is not None:
+                    self._record(op_id, positions[-1])
+            if next_position > positions_start:
+                self._bump_version(queue_name)
+        return positions
+
+    def add_waitlisted(self, queue_name, members, max_size=None):
+        with self._transaction():
+            count = self.waitlist_count(queue_name)
+            next_seq = self.conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM queue_waitlist WHERE queue = ?",
+                (queue_name,)
+            ).fetchone()[0]
+            positions = []
+            for user_id, username in members:
+                if self.is_member(queue_name, user_id):
+                    positions.append(None)
+                    continue
+                position = self.waitlist_position(queue_name, user_id)
+                if position is not None:
+                    positions.append(position)  # Уже ждёт: место не меняется
+                elif max_size is not None and count >= max_size:
+                    positions.append(False)
+                else:
+                    self.conn.execute(
+                        "INSERT INTO queue_waitlist (queue, user_id, username, seq) "
+                        "VALUES (?, ?, ?, ?)",
+                        (queue_name, str(user_id), username, next_seq)
+                    )
+                    next_seq += 1
+                    count += 1
+                    positions.append(count)
+        return positions
+
+    def remove_waitlisted(self, queue_name, user_id):
+        with self._transaction():
+            position = self.waitlist_position(queue_name, user_id)
+            if position is not None:
+                self.conn.execute(
+                    "DELETE FROM queue_waitlist WHERE queue = ? AND user_id = ?",
+                    (queue_name, str(user_id))
+                )
+        return position
+
+    def promote_waitlisted(self, queue_name, max_size):
+        # Первые из листа ожидания занимают свободные места в той же транзакции
+        with self._transaction():
+            row = self.conn.execute(
+                "SELECT is_active FROM queues WHERE name = ?", (queue_name,)
+            ).fetchone()
+            free = max_size - self.member_count(queue_name)
+            if row is None or not row[0] or free <= 0:
+                return []
+            waiting = self.conn.execute(
+                "SELECT user_id, username FROM queue_waitlist WHERE queue = ? ORDER BY seq LIMIT ?",
+                (queue_name, free)
+            ).fetchall()
+            if not waiting:
+                return []
+            self.conn.executemany(
+                "DELETE FROM queue_waitlist WHERE queue = ? AND user_id = ?",
+                [(queue_name, user_id) for user_id, _ in waiting]
+            )
+            positions = self.add_members(queue_name, waiting)
+        return [
+            {"user_id": user_id, "username": username, "position": position}
+            for (user_id, username), position in zip(waiting, positions) if position is not None
+        ]
+
+    def clear_waitlist(self, queue_name):
+        with self._transaction():
+            user_ids = [row[0] for row in self.conn.execute(
+                "SELECT user_id FROM queue_waitlist WHERE queue = ? ORDER BY seq", (queue_name,)
+            )]
+            self.conn.execute("DELETE FROM queue_waitlist WHERE queue = ?", (queue_name,))
+        return user_ids
+
+    def remove_member(self, queue_name, user_id, op_id=None):
+        return self._once(op_id, lambda: self._remove_member(queue_name, user_id))
+
+    def _remove_member(self, queue_name, user_id):
+        with self._transaction():
+            row = self.conn.execute(
+                "SELECT position FROM queue_users WHERE queue = ? AND user_id = ?",
+                (queue_name, str(user_id))
+            ).fetchone()
+            if row is None:
+                return None
+            removed_position = row[0]
+            self.conn.execute(
+                "DELETE FROM queue_users WHERE queue = ? AND user_id = ?",
+                (queue_name, str(user_id))
+            )
+            self.conn.execute(
+                "UPDATE queue_users SET position = position - 1 "
+                "WHERE queue = ? AND position > ?",
+                (queue_name, removed_position)
+            )
+            self._bump_version(queue_name)
+        return removed_position
+
+    def advance_queue(self, queue_name, op_id=None):
+        return self._once(op_id, lambda: self._advance_queue(queue_name))
+
+    def _advance_queue(self, queue_name):
+        with self._transaction():
+            row = self.conn.execute(
+                "SELECT user_id, username FROM queue_users WHERE queue = ? AND position = 1",
+                (queue_name,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._remove_member(queue_name, row[0])
+        return {"user_id": row[0], "username": row[1]}
+
+    def swap_members(self, queue_name, first_user_id, second_user_id, op_id=None):
+        return self._once(
+            op_id, lambda: self._swap_members(queue_name, first_user_id, second_user_id)
+        )
+
+    def _swap_members(self, queue_name, first_user_id, second_user_id):
+        with self._transaction():
+            positions = dict(self.conn.execute(
+                "SELECT user_id, position FROM queue_users "
+                "WHERE queue = ? AND user_id IN (?, ?)",
+                (queue_name, str(first_user_id), str(second_user_id))
+            ).fetchall())
+            if len(positions) != 2:
+                return None
+            first_pos = positions[str(first_user_id)]
+            second_pos = positions[str(second_user_id)]
+            self.conn.executemany(
+                "UPDATE queue_users SET position = ? WHERE queue = ? AND user_id = ?",
+                [(second_pos, queue_name, str(first_user_id)),
+                 (first_pos, queue_name, str(second_user_id))]
+            )
+            self._bump_version(queue_name)
+        return first_pos, second_pos
+
+    # --- Аренда ролей между процессами ---
+
+    def acquire_lease(self, name, holder, ttl):
+        now = time.time()
+        with self._transaction():
+            row = self.conn.execute(
+                "SELECT holder, expires_at FROM leases WHERE name = ?", (name,)
+            ).fetchone()
+            if row is not None and row[0] != holder and row[1] > now:
+                return False
+            self.conn.execute(
+                "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, "
+                "expires_at = excluded.expires_at",
+                (name, holder, now + ttl)
+            )
+        return True
+
+    def release_lease(self, name, holder):
+        self.conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    # --- Миграция ---
+
+    def import_data(self, data):
+        with self._transaction():
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO admins (user_id) VALUES (?)",
+                [(str(a),) for a in data.get("admins", [])]
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO users (user_id) VALUES (?)",
+                [(str(u),) for u in data.get("all_users", [])]
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO blocked_users (user_id) VALUES (?)",
+                [(str(u),) for u in data.get("blocked_users", [])]
+            )
+            for queue_name, info in data.get("queues", {}).items():
+                self.create_queue(queue_name, info)
+            for queue_name, users in data.get("queue_users", {}).items():
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO queue_users (queue, user_id, username, position) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(queue_name, u["user_id"], u.get("username"), u["position"]) for u in users]
+                )
+            for queue_name, users in data.get("queue_waitlists", {}).items():
+                # Порядок листа задаёт seq: нумеруем заново по позициям
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO queue_waitlist (queue, user_id, username, seq) "
+                    "VALUES (?, ?, ?, ?)",
+                    [
+                        (queue_name, u["user_id"], u.get("username"), seq)
+                        for seq, u in enumerate(sorted(users, key=lambda u: u["position"]), 1)
+                    ]
+                )
+            # Выполненные операции переносятся, чтобы повтор нажатия после миграции не сработал дважды
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO operations (op_id, result, at) VALUES (?, ?, ?)",
+                [(op_id, json.dumps(result), at) for op_id, (result, at) in data.get("operations", {}).items()]
+            )
+        self._load_registry()
+
+
+class _Transaction:
+    # Вложенный блок не открывает новую транзакцию, а работает во внешней
+    def __init__(self, conn):
+        self.conn = conn
+        self.owner = False
+        self.started = None
+        self.span = None
+
+    def __enter__(self):
+        self.owner = not self.conn.in_transaction
+        if self.owner:
+            self.started = time.perf_counter()
+            # Отрезок трассы включает и ожидание блокировки записи от других процессов
+            self.span = tracing.span("storage.transaction")
+            self.span.__enter__()
+            self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.owner:
+            try:
+                self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+            finally:
+                self.span.__exit__(exc_type, exc, tb)
+            STORAGE_SECONDS.observe(time.perf_counter() - self.started, "sqlite", "transaction")
+        return False
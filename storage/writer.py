@@ -0,0 +1,69 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+DECODE_ERRORS = (ValueError, msgspec.DecodeError) if msgspec is not None else (ValueError,)
+WRITER_MAILBOX = 64  # Сколько заданий записи может ждать диска, дальше submit ждёт места
+
+
+def dumps(obj):
+    # Компактный JSON в байтах: orjson или msgspec, если установлены, иначе стандартный json
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    if msgspec is not None:
+        return msgspec.json.encode(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    if msgspec is not None:
+        return msgspec.json.decode(data)
+    return json.loads(data)
+
+
+class StorageWriter:
+    """Один поток для файлового ввода-вывода хранилища.
+
+    Задания выполняются строго в порядке submit, поэтому запись журнала,
+    снимок и очистка журнала не обгоняют друг друга без дополнительных
+    блокировок. Очередь заданий ограничена: если диск не успевает,
+    submit ждёт, и задержка доходит до тех, кто ждёт flush().
+    """
+
+    def __init__(self, mailbox=WRITER_MAILBOX):
+        self.mailbox = mailbox
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage-io")
+        self._slots = None
+        self._last = None
+
+    async def submit(self, fn, *args):
+        # Возвращает future задания; дождаться его — дождаться и всех предыдущих
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.mailbox)
+        await self._slots.acquire()
+        future = asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._last = future
+        return future
+
+    async def drain(self):
+        if self._last is not None:
+            await asyncio.gather(self._last, return_exceptions=True)
+
+    def run(self, fn, *args):
+        # Синхронно, в том же потоке записи: для вызовов вне цикла событий
+        return self._executor.submit(fn, *args).result()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,130 @@
+import contextvars
+import logging
+import os
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "default"  # Личные чаты и всё, что было до разделения по группам
+
+_current = contextvars.ContextVar("tenant", default=DEFAULT_TENANT)
+
+
+class Tenant:
+    """Состояние одного тенанта: своё хранилище и свои фоновые задачи."""
+
+    def __init__(self, tenant_id, store, admission, scheduler, boards, keyboards, listings, archive):
+        self.id = tenant_id
+        self.store = store
+        self.admission = admission
+        self.scheduler = scheduler
+        self.boards = boards
+        self.keyboards = keyboards
+        self.listings = listings
+        self.archive = archive
+        self.archiving = set()  # Очереди, которые сейчас пишутся в архив: сверка не запустит их второй раз
+        self.promoted = {}  # очередь -> user_id переведённых из листа, ещё не получивших уведомление
+
+    def start(self):
+        self.store.start()
+        self.admission.start()
+        self.scheduler.start()
+
+    async def stop(self):
+        await self.scheduler.close()
+        await self.admission.close()
+        await self.boards.close()
+
+    async def close(self):
+        await self.store.close()
+
+
+class TenantRegistry:
+    """Тенанты — групповые чаты, в которых работает бот, — и их состояние.
+
+    Каждый тенант собирает factory: хранилище в своём файле со своей
+    блокировкой и потоком записи, свой конвейер вступлений, таймеры и
+    табло, поэтому всплеск в одной группе не задерживает остальные.
+    Текущий тенант хранится в contextvar: задачи и таймеры, созданные
+    при обработке обновления, наследуют его.
+    """
+
+    def __init__(self, factory, directory):
+        self.factory = factory
+        self.directory = directory
+        self._tenants = {}
+        self._started = False
+
+    def __len__(self):
+        return len(self._tenants)
+
+    def __iter__(self):
+        return iter(list(self._tenants.values()))
+
+    def path(self, tenant_id, filename):
+        return os.path.join(self.directory, tenant_id, filename)
+
+    def known(self):
+        # Тенанты с данными на диске; каталоги могли появиться и у другого процесса
+        ids = [DEFAULT_TENANT]
+        if os.path.isdir(self.directory):
+            ids.extend(sorted(
+                name for name in os.listdir(self.directory)
+                if os.path.isdir(os.path.join(self.directory, name))
+            ))
+        return ids
+
+    def get(self, tenant_id=None):
+        tenant_id = tenant_id or _current.get()
+        tenant = self._tenants.get(tenant_id)
+        if tenant is None:
+            tenant = self._open(tenant_id)
+        return tenant
+
+    def _open(self, tenant_id):
+        # Фоновые задачи тенанта создаются в его контексте и работают с его состоянием
+        with self.use(tenant_id):
+            tenant = self._tenants[tenant_id] = self.factory(tenant_id)
+            if self._started:
+                tenant.start()
+        logger.info(f"Открыт тенант {tenant_id}")
+        return tenant
+
+    @contextmanager
+    def use(self, tenant_id):
+        token = _current.set(tenant_id)
+        try:
+            yield
+        finally:
+            _current.reset(token)
+
+    def enter(self, tenant_id):
+        # Для обработки обновления: тенант остаётся текущим до конца задачи этого обновления
+        _current.set(tenant_id)
+
+    def start(self):
+        self._started = True
+        for tenant_id, tenant in list(self._tenants.items()):
+            with self.use(tenant_id):
+                tenant.start()
+        self.refresh()
+
+    def refresh(self):
+        for tenant_id in self.known():
+            if tenant_id not in self._tenants:
+                self._open(tenant_id)
+
+    async def stop(self):
+        for tenant in self:
+            with self.use(tenant.id):  # Табло дописывают последние правки уже с данными своего тенанта
+                await tenant.stop()
+
+    async def close(self):
+        for tenant in self:
+            with self.use(tenant.id):
+                await tenant.close()
+
+    def block_user(self, user_id):
+        # Личный чат у пользователя один на все группы: недоступен — значит, для всех тенантов
+        for tenant in self:
+            tenant.store.block_user(user_id)
@@ -0,0 +1,64 @@
+import time
+from collections import OrderedDict
+
+import metrics
+from ratelimit import TokenBucket
+
+CALLBACK_RATE = 2  # Нажатий в секунду на пользователя в среднем
+CALLBACK_BURST = 5  # Сколько нажатий подряд пропускаем без ожидания
+DUPLICATE_WINDOW = 2.0  # Повтор той же кнопки за это время считаем дребезгом
+MAX_TRACKED_USERS = 10000
+
+REPEATED = "repeated"
+RATE_LIMITED = "rate_limited"
+
+THROTTLED = metrics.Counter(
+    "queuebot_callback_throttled_total", "Нажатия, отсечённые до обработчика", ("reason",)
+)
+
+
+class CallbackThrottle:
+    """Фильтр нажатий перед обработчиками: дребезг одной кнопки и лимит на пользователя.
+
+    Повтор тех же callback_data в пределах окна и нажатия сверх лимита
+    отсекаются без обращения к хранилищу; вызывающий отвечает на них
+    коротким всплывающим уведомлением. Повтор схлопывается только для
+    идемпотентных действий: второе "следующий" подряд — намеренное.
+    """
+
+    def __init__(self, rate=CALLBACK_RATE, burst=CALLBACK_BURST,
+                 window=DUPLICATE_WINDOW, max_users=MAX_TRACKED_USERS):
+        self.rate = rate
+        self.burst = burst
+        self.window = window
+        self.max_users = max_users
+        self._buckets = OrderedDict()  # user_id -> TokenBucket, давно нажимавшие — в начале
+        self._last = {}  # user_id -> (callback_data, когда пропустили)
+
+    def check(self, user_id, data, idempotent=True):
+        # None — нажатие пропускаем, иначе причина отказа
+        now = time.monotonic()
+        last = self._last.get(user_id)
+        if idempotent and last is not None and last[0] == data and now - last[1] < self.window:
+            THROTTLED.inc(REPEATED)
+            return REPEATED
+
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= self.max_users:
+                self._evict()
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst)
+        else:
+            self._buckets.move_to_end(user_id)
+        if not bucket.try_acquire():
+            THROTTLED.inc(RATE_LIMITED)
+            return RATE_LIMITED
+
+        self._last[user_id] = (data, now)
+        return None
+
+    def _evict(self):
+        # Первым уходит тот, кто дольше всех не нажимал; при MAX_TRACKED_USERS
+        # его ведро и окно повтора почти наверняка уже не нужны
+        user_id, _ = self._buckets.popitem(last=False)
+        self._last.pop(user_id, None)
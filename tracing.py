@@ -0,0 +1,215 @@
+"""Трассировка обработки обновлений и профилирование по окну времени.
+
+Пока трассировка выключена, span() отдаёт общий пустой контекст и ничего
+не пишет. Включённая, она собирает на каждое обновление дерево отрезков
+(обработчик -> хранилище -> запросы к Bot API) с временем каждого и пишет
+одну строку JSON на обновление в ротируемый файл. Отчёт по файлам —
+python -m bench.trace_report.
+"""
+import asyncio
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from telegram.request import BaseRequest
+
+logger = logging.getLogger(__name__)
+
+TRACE_MAX_BYTES = 10 * 1024 * 1024
+TRACE_BACKUPS = 5
+PROFILE_TOP = 25  # Сколько строк pstats показать в ответе на /profile
+
+_enabled = False
+_trace_log = logging.getLogger("queuebot.trace")
+_trace_log.propagate = False  # Трассы только в свой файл, не в общий лог
+_current = contextvars.ContextVar("trace", default=None)
+_NOOP = nullcontext()
+_profiling = False
+
+
+def enabled():
+    return _enabled
+
+
+def enable(path, max_bytes=TRACE_MAX_BYTES, backups=TRACE_BACKUPS):
+    global _enabled
+    if _enabled:
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _trace_log.addHandler(handler)
+    _trace_log.setLevel(logging.INFO)
+    _enabled = True
+    logger.info(f"Трассировка обновлений включена: {path}")
+
+
+def disable():
+    global _enabled
+    if not _enabled:
+        return
+    _enabled = False
+    for handler in list(_trace_log.handlers):
+        _trace_log.removeHandler(handler)
+        handler.close()
+    logger.info("Трассировка обновлений выключена")
+
+
+class _Trace:
+    __slots__ = ("update_id", "attrs", "started", "spans", "stack", "closed")
+
+    def __init__(self, update_id, attrs):
+        self.update_id = update_id
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.spans = []  # [имя, родитель, начало от старта, длительность, атрибуты]
+        self.stack = []
+        self.closed = False
+
+
+class _Span:
+    __slots__ = ("trace", "index", "started")
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.index = len(trace.spans)
+        trace.spans.append([name, trace.stack[-1] if trace.stack else None, 0.0, None, attrs or None])
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.trace.spans[self.index][2] = self.started - self.trace.started
+        self.trace.stack.append(self.index)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        span = self.trace.spans[self.index]
+        span[3] = time.perf_counter() - self.started
+        if exc_type is not None:
+            span[4] = dict(span[4] or {}, error=exc_type.__name__)
+        if self.trace.stack and self.trace.stack[-1] == self.index:
+            self.trace.stack.pop()
+        return False
+
+
+class _Root:
+    __slots__ = ("trace", "token")
+
+    def __init__(self, update_id, attrs):
+        self.trace = _Trace(update_id, attrs)
+
+    def __enter__(self):
+        self.token = _current.set(self.trace)
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self.token)
+        trace = self.trace
+        # Задачи, запущенные из обработчика (рассылки), наследуют трассу, но в неё уже не пишут
+        trace.closed = True
+        if exc_type is not None:
+            trace.attrs["error"] = exc_type.__name__
+        if _enabled:
+            _write(trace)
+        return False
+
+
+def _write(trace):
+    record = {
+        "ts": round(time.time(), 3),
+        "update_id": trace.update_id,
+        "ms": round((time.perf_counter() - trace.started) * 1000, 3),
+        **trace.attrs,
+        "spans": [
+            {
+                "name": name, "parent": parent, "at": round(start * 1000, 3),
+                "ms": round(duration * 1000, 3) if duration is not None else None,
+                **(attrs or {})
+            }
+            for name, parent, start, duration, attrs in trace.spans
+        ],
+    }
+    try:
+        _trace_log.info(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+    except Exception as e:
+        logger.error(f"Не удалось записать трассу обновления {trace.update_id}: {e}")
+
+
+def trace(update_id, **attrs):
+    # Корень трассы одного обновления; вложенные span() попадают в неё
+    if not _enabled:
+        return _NOOP
+    return _Root(update_id, attrs)
+
+
+def span(name, **attrs):
+    current = _current.get()
+    if current is None or current.closed:
+        return _NOOP
+    return _Span(current, name, attrs)
+
+
+def annotate(**attrs):
+    # Атрибуты текущего обновления: операция кнопки, тенант
+    current = _current.get()
+    if current is not None and not current.closed:
+        current.attrs.update(attrs)
+
+
+class TracedRequest(BaseRequest):
+    """Обёртка над запросами бота: каждый вызов Bot API — отрезок трассы."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    @property
+    def read_timeout(self):
+        return self.inner.read_timeout
+
+    async def initialize(self):
+        await self.inner.initialize()
+
+    async def shutdown(self):
+        await self.inner.shutdown()
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        current = _current.get()
+        if current is None or current.closed:
+            return await self.inner.do_request(url, method, request_data, **kwargs)
+        with _Span(current, "api." + url.rsplit("/", 1)[-1], None) as span:
+            code, payload = await self.inner.do_request(url, method, request_data, **kwargs)
+            if code != 200:
+                current.spans[span.index][4] = {"status": code}
+            return code, payload
+
+
+async def profile(seconds, directory, top=PROFILE_TOP):
+    """cProfile потока цикла событий на seconds секунд: (путь к .pstats, сводка)."""
+    global _profiling
+    if _profiling:
+        return None, "Профилирование уже идёт"
+    _profiling = True
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+    finally:
+        _profiling = False
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"profile-{datetime.now():%Y%m%d-%H%M%S}.pstats")
+    await asyncio.to_thread(profiler.dump_stats, path)
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).strip_dirs().sort_stats("cumulative").print_stats(top)
+    return path, out.getvalue()
@@ -0,0 +1,64 @@
+import asyncio
+
+from telegram.ext import BaseUpdateProcessor
+
+import tracing
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений с сохранением порядка внутри одного пользователя.
+
+    Обновления разных пользователей идут одновременно (до max_concurrent_updates),
+    а два нажатия одного пользователя обрабатываются строго по очереди.
+    """
+
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        self._locks = {}  # ключ -> [Lock, сколько обновлений его ждёт или держит]
+
+    @staticmethod
+    def _key(update):
+        user = getattr(update, "effective_user", None)
+        if user is not None:
+            return user.id
+        chat = getattr(update, "effective_chat", None)
+        return chat.id if chat is not None else None
+
+    @staticmethod
+    def _kind(update):
+        if getattr(update, "callback_query", None) is not None:
+            return "callback_query"
+        if getattr(update, "message", None) is not None:
+            return "message"
+        return "other"
+
+    async def do_process_update(self, update, coroutine):
+        with tracing.trace(getattr(update, "update_id", None), kind=self._kind(update)):
+            await self._process_in_order(update, coroutine)
+
+    async def _process_in_order(self, update, coroutine):
+        key = self._key(update)
+        if key is None:
+            await coroutine
+            return
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            with tracing.span("user_lock"):  # Ожидание предыдущих обновлений этого пользователя
+                await entry[0].acquire()
+            try:
+                await coroutine
+            finally:
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
@@ -0,0 +1,133 @@
+import json
+import logging
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1 << 20  # Обновление от Telegram заведомо меньше мегабайта
+SECRET_HEADER = b"x-telegram-bot-api-secret-token"
+
+
+async def _respond(send, status, body=b""):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body.extend(message.get("body", b""))
+        if len(body) > MAX_BODY_SIZE:
+            return None
+        if not message.get("more_body", False):
+            return bytes(body)
+
+
+class WebhookApp:
+    """ASGI-приложение: принимает обновления от Telegram и кладёт их в update_queue.
+
+    Обработка идёт в Application, ответ Telegram отдаётся сразу после
+    постановки в очередь. /healthz — процесс жив, /readyz — принимает
+    обновления. После begin_drain новые обновления получают 503, и
+    Telegram повторит их позже, уже в следующий запуск.
+    """
+
+    def __init__(self, application, path, secret_token=None):
+        self.application = application
+        self.path = "/" + path.strip("/")
+        self.secret_token = secret_token.encode() if secret_token else None
+        self.draining = False
+        self.stats = {"accepted": 0, "rejected": 0}
+
+    @property
+    def ready(self):
+        return self.application.running and not self.draining
+
+    def begin_drain(self):
+        if not self.draining:
+            logger.info("Вебхук больше не принимает обновления, дорабатываем принятые")
+        self.draining = True
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        path = scope["path"]
+        if path == "/healthz":
+            await _respond(send, 200, b"ok")
+        elif path == "/readyz":
+            if self.ready:
+                await _respond(send, 200, b"ready")
+            else:
+                await _respond(send, 503, b"draining" if self.draining else b"starting")
+        elif path == self.path:
+            if scope["method"] != "POST":
+                await _respond(send, 405)
+            else:
+                await self._handle_update(scope, receive, send)
+        else:
+            await _respond(send, 404)
+
+    async def _handle_update(self, scope, receive, send):
+        if not self.ready:
+            self.stats["rejected"] += 1
+            await _respond(send, 503)
+            return
+        if self.secret_token is not None:
+            headers = dict(scope.get("headers", []))
+            if headers.get(SECRET_HEADER) != self.secret_token:
+                await _respond(send, 403)
+                return
+
+        body = await _read_body(receive)
+        if body is None:
+            await _respond(send, 413)
+            return
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except Exception as e:
+            logger.warning(f"Вебхук: некорректное обновление: {e}")
+            await _respond(send, 400)
+            return
+
+        await self.application.update_queue.put(update)
+        self.stats["accepted"] += 1
+        await _respond(send, 200)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+async def serve(webhook, host, port):
+    """Запускает uvicorn и возвращается после SIGINT/SIGTERM, когда сервер остановлен."""
+    try:
+        import uvicorn
+    except ImportError:
+        raise RuntimeError("Для режима webhook нужен uvicorn: pip install uvicorn") from None
+
+    class Server(uvicorn.Server):
+        def handle_exit(self, sig, frame):
+            # Сначала /readyz и вебхук начинают отвечать 503, потом сервер закрывается
+            webhook.begin_drain()
+            super().handle_exit(sig, frame)
+
+    config = uvicorn.Config(webhook, host=host, port=port, lifespan="off", log_level="warning")
+    await Server(config).serve()